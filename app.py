@@ -1,17 +1,20 @@
 # app.py - 骏泰素材工作台
 import zipfile
-from io import BytesIO
 import streamlit as st
 import os
 import math
 from PIL import Image, ImageDraw
-import tempfile
-import random
+import shutil
 import base64
-import cv2
-import numpy as np
-from moviepy.editor import VideoFileClip, AudioFileClip
-import requests
+import time
+import uuid
+from image_engine import ComposeJob, default_worker_count
+from image_cache import decode_cache, overlay_cache, upload_digest
+from zip_stream import ZipStreamWriter, archive_size, release_archive, archive_reader, file_reader
+from job_store import SynthesisJob, cleanup_old_jobs
+from job_queue import job_queue
+from watermark_engine import (list_watermark_sources, iter_watermark_results,
+                              run_watermark_task, preview_proxy, render_preview)
 
 # 设置页面配置
 st.set_page_config(
@@ -666,6 +669,8 @@ st.markdown(get_custom_css(), unsafe_allow_html=True)
 st.markdown('<h1 class="main-header">🎨 骏泰素材工作台</h1>', unsafe_allow_html=True)  # 移除emoji，或替换为logo图片
 
 # 初始化会话状态
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex  # 后台任务队列按会话区分
 if 'current_page' not in st.session_state:
     st.session_state.current_page = 0
 if 'processed_images' not in st.session_state:
@@ -674,12 +679,16 @@ if 'last_zip_buffer' not in st.session_state:
     st.session_state.last_zip_buffer = None
 if 'processed_video' not in st.session_state:
     st.session_state.processed_video = None
+if 'video_batch_zip' not in st.session_state:
+    st.session_state.video_batch_zip = None
+if 'video_batch_summary' not in st.session_state:
+    st.session_state.video_batch_summary = None
 if 'video_info' not in st.session_state:
     st.session_state.video_info = None
 if 'unsplash_photos' not in st.session_state:
     st.session_state.unsplash_photos = []
-if 'unsplash_selected_bg' not in st.session_state:
-    st.session_state.unsplash_selected_bg = None
+if 'unsplash_selected_bgs' not in st.session_state:
+    st.session_state.unsplash_selected_bgs = {}  # 选中的背景：图片ID → UnsplashPhoto（可跨页多选）
 if 'unsplash_search_query' not in st.session_state:
     st.session_state.unsplash_search_query = "white background"
 if 'unsplash_search_trigger' not in st.session_state:
@@ -688,10 +697,6 @@ if 'unsplash_current_page' not in st.session_state:
     st.session_state.unsplash_current_page = 1
 if 'unsplash_total_pages' not in st.session_state:
     st.session_state.unsplash_total_pages = 0
-if 'unsplash_selected_page' not in st.session_state:
-    st.session_state.unsplash_selected_page = 1  # 选中图片的页码
-if 'unsplash_selected_idx' not in st.session_state:
-    st.session_state.unsplash_selected_idx = -1  # 选中图片的索引（-1表示未选中）
 if 'synthesize_zip_buffer' not in st.session_state:
     st.session_state.synthesize_zip_buffer = None
 if 'synthesize_zip_info' not in st.session_state:
@@ -738,6 +743,9 @@ if 'mask_custom_color' not in st.session_state:
 if 'mask_color_rgb' not in st.session_state:
     st.session_state.mask_color_rgb = (255, 255, 255)  # 默认白色RGB
 
+# 后台合成任务进度的刷新间隔（秒）
+SYNTHESIS_POLL_SECONDS = 0.5
+
 # 预设颜色选项
 PRESET_COLORS = {
     "白色": "#FFFFFF",
@@ -759,63 +767,50 @@ PRESET_COLORS = {
 
 # ==================== Unsplash API类 ====================
 class UnsplashAPI:
+    """页面使用的 Unsplash 接口：请求和缓存由共享的 UnsplashClient 完成，这里只负责提示错误"""
     def __init__(self):
-        # 自动从Streamlit Secrets读取API密钥
+        # 自动从Streamlit Secrets读取API密钥（本地测试时也可以用环境变量）
         try:
             self.access_key = st.secrets["UNSPLASH_ACCESS_KEY"]
         except:
-            self.access_key = ""
-            st.warning("⚠️ 未找到Unsplash API密钥，请在Streamlit Secrets中配置UNSPLASH_ACCESS_KEY")
+            self.access_key = os.environ.get("UNSPLASH_ACCESS_KEY", "")
+            if not self.access_key:
+                st.warning("⚠️ 未找到Unsplash API密钥，请在Streamlit Secrets中配置UNSPLASH_ACCESS_KEY")
         
-        self.base_url = "https://api.unsplash.com"
+        from unsplash_client import get_client
+        self.client = get_client(self.access_key) if self.access_key else None
     
     def search_photos(self, query, page=1, per_page=12):
         """搜索Unsplash图片"""
         if not self.access_key:
             return [], 0, 0  # 返回空列表和0页
         
-        url = f"{self.base_url}/search/photos"
-        headers = {"Authorization": f"Client-ID {self.access_key}"}
-        params = {
-            "query": query,
-            "page": page,
-            "per_page": per_page,
-            "orientation": "squarish",
-        }
-        
+        from unsplash_client import UnsplashError
         try:
-            response = requests.get(url, headers=headers, params=params, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                # 从API响应中获取总页数
-                total = data.get("total", 0)
-                total_pages = data.get("total_pages", 0)
-
-                # 如果API没有返回total_pages，我们计算一下
-                if total_pages == 0 and total > 0:
-                    total_pages = (total + per_page - 1) // per_page
-                total_pages = min(total_pages, 1000)
-
-                return data.get("results", []), total_pages, total
-            elif response.status_code == 401:
+            return self.client.search(query, page=page, per_page=per_page)
+        except UnsplashError as e:
+            if e.status_code == 401:
                 st.error("Unsplash API密钥无效，请检查您的密钥")
-                return [], 0, 0
+            elif e.status_code:
+                st.error(f"Unsplash API错误: {e.status_code}")
             else:
-                st.error(f"Unsplash API错误: {response.status_code}")
-                return [], 0, 0
-        except Exception as e:
-            st.error(f"Unsplash API请求失败: {e}")
+                st.error(f"Unsplash API请求失败: {e}")
             return [], 0, 0
-    
-    def download_photo(self, photo_url):
-        """下载图片"""
-        try:
-            response = requests.get(photo_url, timeout=10)
-            if response.status_code == 200:
-                return Image.open(BytesIO(response.content))
-        except Exception as e:
-            st.error(f"下载图片失败: {e}")
-        return None
+
+# ==================== 下载辅助函数 ====================
+try:
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    # download_button 的 data 可以传入函数（点击下载时才执行）
+    DEFERRED_DOWNLOAD = hasattr(MediaFileManager, "add_deferred")
+except ImportError:
+    DEFERRED_DOWNLOAD = False
+
+def download_data(reader):
+    """download_button 的数据：reader 为 zip_stream.file_reader / archive_reader 返回的读取函数
+
+    支持延迟下载时直接传入函数，页面重新运行时不读取文件；旧版 Streamlit 只能立即读取。
+    """
+    return reader if DEFERRED_DOWNLOAD else reader()
 
 # ==================== 颜色辅助函数 ====================
 def hex_to_rgb(hex_color):
@@ -843,67 +838,8 @@ def get_current_mask_color():
         return hex_to_rgb(hex_color)
 
 # ==================== 核心函数定义 ====================
-def compose_image(bg_img, product_img, logo_img, product_size, output_size, output_format, 
-                  mask_enabled=False, mask_color=(255, 255, 255), mask_opacity=20):
-    """合成单张图片的核心函数
-    mask_enabled: 是否启用遮罩
-    mask_color: 遮罩颜色RGB元组
-    mask_opacity: 遮罩层不透明度（0-100）
-    """
-    # 1. 处理背景：调整到输出尺寸（智能裁剪铺满）
-    bg = bg_img.convert('RGBA')
-    bg_ratio = output_size / min(bg.width, bg.height)
-    new_width = int(bg.width * bg_ratio)
-    new_height = int(bg.height * bg_ratio)
-    bg = bg.resize((new_width, new_height), Image.Resampling.LANCZOS)
-    
-    # 居中裁剪
-    left = (bg.width - output_size) // 2
-    top = (bg.height - output_size) // 2
-    right = left + output_size
-    bottom = top + output_size
-    bg = bg.crop((left, top, right, bottom))
-    
-    # 2. 添加颜色遮罩层（如果启用）
-    if mask_enabled and mask_opacity > 0:
-        # 创建颜色遮罩层
-        mask_opacity_int = int(mask_opacity * 255 / 100)  # 转换为0-255范围
-        r, g, b = mask_color
-        color_layer = Image.new('RGBA', bg.size, (r, g, b, mask_opacity_int))
-        # 将颜色遮罩层与背景图叠加
-        bg = Image.alpha_composite(bg, color_layer)
-    
-    # 3. 处理产品图：调整大小并居中放置
-    product = product_img.convert('RGBA')
-    product.thumbnail((product_size, product_size), Image.Resampling.LANCZOS)
-    
-    # 将产品图居中放置
-    product_x = (output_size - product.width) // 2
-    product_y = (output_size - product.height) // 2
-    
-    # 将产品图粘贴到背景上
-    bg.paste(product, (product_x, product_y), product)
-    
-    # 4. 处理Logo图 - 直接全画布叠加
-    if logo_img:
-        logo = logo_img.convert('RGBA')
-        # 确保Logo图尺寸与输出尺寸一致
-        if logo.size != (output_size, output_size):
-            logo = logo.resize((output_size, output_size), Image.Resampling.LANCZOS)
-        # 直接以遮罩方式叠加整个Logo图层
-        bg = Image.alpha_composite(bg, logo)
-    
-    # 5. 根据输出格式处理背景
-    if output_format.upper() == 'JPG':
-        bg_rgb = Image.new('RGB', bg.size, (255, 255, 255))
-        bg_rgb.paste(bg, mask=bg.split()[3])
-        final_image = bg_rgb
-    else:
-        final_image = bg
-    
-    return final_image
-
-def remove_random_frames(input_video_path, output_video_path, progress_bar=None, status_text=None):
+def remove_random_frames(input_video_path, output_video_path, progress_bar=None, status_text=None, smart=True,
+                         digest=None):
     """
     从视频中随机删除两帧并导出新视频 (保留音频)
     参数:
@@ -911,168 +847,40 @@ def remove_random_frames(input_video_path, output_video_path, progress_bar=None,
         output_video_path: 输出视频文件路径
         progress_bar: Streamlit进度条对象
         status_text: Streamlit状态文本对象
+        smart: 智能渲染，只重新编码包含被删帧的GOP（不支持时自动整段重新编码）
+        digest: 输入文件的内容哈希，用于复用已缓存的视频信息
     """
+    from video_engine import probe_cache, pick_frames_to_remove, remove_frames
+    
     # 检查输入文件是否存在
     if not os.path.exists(input_video_path):
         raise FileNotFoundError(f"找不到输入视频文件 '{input_video_path}'")
     
-    # 使用OpenCV读取视频信息
-    cap = cv2.VideoCapture(input_video_path)
-    if not cap.isOpened():
+    # 获取视频基本信息（与信息卡片共用缓存，精确帧数来自包头）
+    try:
+        video_info = probe_cache.probe(input_video_path, digest)
+    except (OSError, RuntimeError, StopIteration):
         raise ValueError("无法打开视频文件，请检查格式是否支持（如MP4）。")
     
-    # 获取视频基本信息
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    duration = total_frames / fps
-    
-    video_info = {
-        "total_frames": total_frames,
-        "fps": fps,
-        "width": width,
-        "height": height,
-        "duration": duration
-    }
-    
-    # 检查视频长度是否足够
-    if total_frames <= 2:
-        cap.release()
-        raise ValueError("视频太短，不足以移除两帧。")
-    
     # 随机选择要删除的两帧（确保不重复且不在首尾关键帧）
-    # 避免删除第0帧和最后一帧，以防编码问题
-    available_frames = list(range(1, total_frames - 1))
-    if len(available_frames) >= 2:
-        frames_to_remove = sorted(random.sample(available_frames, 2))
-    else:
-        frames_to_remove = sorted(random.sample(range(total_frames), min(2, total_frames)))
+    frames_to_remove = pick_frames_to_remove(video_info["total_frames"])
     
     # 更新状态
     if status_text:
         status_text.text(f"将删除第 {frames_to_remove[0]} 帧和第 {frames_to_remove[1]} 帧")
     
-    # 1. 首先提取并保存音频（使用moviepy）
-    try:
-        video_clip = VideoFileClip(input_video_path)
-        audio = video_clip.audio
-        has_audio = audio is not None
-        
-        # 创建临时音频文件
-        temp_audio_path = "temp_audio.wav"
-        if has_audio:
-            audio.write_audiofile(temp_audio_path, verbose=False, logger=None)
-        video_clip.close()
-    except Exception as e:
-        st.warning(f"音频处理出现异常，将继续处理视频（可能无音频）: {e}")
-        has_audio = False
-    
-    # 2. 处理视频帧（移除指定帧）
-    fourcc = cv2.VideoWriter_fourcc('m', 'p', '4', 'v')  # MP4编码
-    out = cv2.VideoWriter('temp_video_noaudio.mp4', fourcc, fps, (width, height))
-    
-    frame_index = 0
-    saved_count = 0
-    
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break  # 视频读取完毕
-            
-        # 如果当前帧不在删除列表中，则写入新视频
-        if frame_index not in frames_to_remove:
-            out.write(frame)
-            saved_count += 1
-            
-        frame_index += 1
-        
-        # 更新进度条
-        if progress_bar and total_frames > 0:
-            progress = frame_index / total_frames
-            progress_bar.progress(progress)
-    
-    # 释放资源
-    cap.release()
-    out.release()
-    
-    # 3. 重新合并音频（如果存在）
-    if has_audio:
-        if status_text:
-            status_text.text("正在重新合并音频...")
-        
-        try:
-            # 加载处理后的无音频视频
-            video_no_audio = VideoFileClip('temp_video_noaudio.mp4')
-            # 加载之前提取的音频
-            final_clip = video_no_audio.set_audio(AudioFileClip(temp_audio_path))
-            # 写入最终文件
-            final_clip.write_videofile(
-                output_video_path,
-                codec='libx264',
-                audio_codec='aac',
-                verbose=False,
-                logger=None
-            )
-            video_no_audio.close()
-            final_clip.close()
-            
-            # 清理临时文件
-            if os.path.exists('temp_video_noaudio.mp4'):
-                os.remove('temp_video_noaudio.mp4')
-            if os.path.exists(temp_audio_path):
-                os.remove(temp_audio_path)
-        except Exception as e:
-            st.warning(f"音视频合并失败，将输出无音频视频: {e}")
-            # 如果合并失败，则将无音频视频作为输出
-            if os.path.exists('temp_video_noaudio.mp4'):
-                os.rename('temp_video_noaudio.mp4', output_video_path)
-    else:
-        # 无音频，直接重命名临时文件
-        if os.path.exists('temp_video_noaudio.mp4'):
-            os.rename('temp_video_noaudio.mp4', output_video_path)
+    # 一次解码、一次编码完成抽帧（智能渲染时只编码受影响的GOP），原始音频流直接复制
+    progress_callback = progress_bar.progress if progress_bar else None
+    saved_count, audio_mode, render_mode = remove_frames(
+        input_video_path, output_video_path, frames_to_remove, video_info, progress_callback, smart=smart
+    )
+    video_info["render_mode"] = render_mode
+    if video_info["audio_codec"] and audio_mode == "none":
+        st.warning("音频处理失败，已输出无音频视频")
     
     return output_video_path, video_info, frames_to_remove, saved_count
 
 # ==================== Logo水印添加核心函数 ====================
-def add_logo_to_image(base_image, logo_image, x_percent, y_percent, size_percent, opacity):
-    """将Logo添加到图片上的核心函数"""
-    try:
-        # 复制基础图片
-        base_img = base_image.copy().convert('RGBA')
-        logo_img = logo_image.copy().convert('RGBA')
-        
-        # 计算Logo的实际尺寸（基于图片宽高的百分比）
-        base_width, base_height = base_img.size
-        logo_size = int(min(base_width, base_height) * (size_percent / 100))
-        
-        # 调整Logo大小
-        logo_img.thumbnail((logo_size, logo_size), Image.Resampling.LANCZOS)
-        
-        # 调整Logo透明度
-        if opacity < 255:
-            alpha = logo_img.split()[3]
-            alpha = alpha.point(lambda p: p * opacity // 255)
-            logo_img.putalpha(alpha)
-        
-        # 计算Logo位置（基于百分比）
-        logo_width, logo_height = logo_img.size
-        x_pos = int((base_width - logo_width) * (x_percent / 100))
-        y_pos = int((base_height - logo_height) * (y_percent / 100))
-        
-        # 创建透明图层用于放置Logo
-        logo_layer = Image.new('RGBA', base_img.size, (0, 0, 0, 0))
-        logo_layer.paste(logo_img, (x_pos, y_pos), logo_img)
-        
-        # 合并图片
-        result = Image.alpha_composite(base_img, logo_layer)
-        
-        return result
-    
-    except Exception as e:
-        st.error(f"添加Logo时发生错误: {e}")
-        return None
-
 def apply_preset_position(preset_name, base_width, base_height, logo_width, logo_height):
     """应用预设位置"""
     presets = {
@@ -1093,48 +901,6 @@ def apply_preset_position(preset_name, base_width, base_height, logo_width, logo
         # 自定义位置，返回当前值
         return (st.session_state.logo_adder_logo_x, st.session_state.logo_adder_logo_y)
 
-def batch_add_logo_to_images(images, logo_img, x_percent, y_percent, size_percent, opacity):
-    """批量添加Logo到多张图片"""
-    processed_images = []
-    
-    for i, img in enumerate(images):
-        result = add_logo_to_image(img, logo_img, x_percent, y_percent, size_percent, opacity)
-        if result:
-            processed_images.append(result)
-    
-    return processed_images
-
-def create_zip_from_images(images, original_names, output_format='PNG'):
-    """从图片创建ZIP文件"""
-    zip_buffer = BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for i, (img, original_name) in enumerate(zip(images, original_names)):
-            img_buffer = BytesIO()
-            
-            if output_format.upper() == 'JPG':
-                # 转换RGBA为RGB
-                if img.mode == 'RGBA':
-                    rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                    rgb_img.paste(img, mask=img.split()[3])
-                    img = rgb_img
-                img.save(img_buffer, format='JPEG', quality=95)
-                ext = '.jpg'
-            else:
-                img.save(img_buffer, format='PNG')
-                ext = '.png'
-            
-            img_buffer.seek(0)
-            
-            # 生成文件名
-            name_without_ext = os.path.splitext(original_name)[0]
-            filename = f"{name_without_ext}_with_logo_{i+1:03d}{ext}"
-            
-            zip_file.writestr(filename, img_buffer.getvalue())
-    
-    zip_buffer.seek(0)
-    return zip_buffer
-
 # ==================== 侧边栏设置区域 ====================
 with st.sidebar:
     st.markdown("### ⚙️ 合成设置")
@@ -1310,7 +1076,31 @@ with st.sidebar:
             key="output_format_radio"
         )
         st.session_state.output_format = output_format
-    
+
+    # 并行合成进程数（默认使用全部CPU核心）
+    with st.expander("高级设置", expanded=False):
+        # 上限至少为默认并行数（CPU核数或 COMPOSE_WORKERS 可能超过64）
+        max_compose_workers = max(64, default_worker_count())
+        compose_workers = st.number_input(
+            "并行合成进程数",
+            min_value=1,
+            max_value=max_compose_workers,
+            value=min(st.session_state.get('compose_workers', default_worker_count()), max_compose_workers),
+            step=1,
+            help="同时合成的进程数，设为1则串行处理",
+            key="compose_workers_input"
+        )
+        st.session_state.compose_workers = int(compose_workers)
+
+        # 解码缓存统计（所有会话共享同一缓存）
+        cache_stats = decode_cache.stats
+        session_cache_stats = decode_cache.session_stats(st.session_state.session_id)
+        st.caption(
+            f"解码缓存: {cache_stats['entries']} 项, {cache_stats['bytes'] / 1024 / 1024:.0f} MB | "
+            f"命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']} "
+            f"(本会话 {session_cache_stats['hits']} / {session_cache_stats['misses']})"
+        )
+
     st.markdown("---")
     
     # 5. 处理按钮
@@ -1325,8 +1115,7 @@ with st.sidebar:
     # 侧边栏 - 下载所有合成图片按钮（替换原有代码）
     st.markdown("---")
     # 严谨判断：是否有有效ZIP缓冲区和有效数据
-    if st.session_state.synthesize_zip_buffer is not None and \
-    st.session_state.synthesize_zip_buffer.getvalue() and \
+    if archive_size(st.session_state.synthesize_zip_buffer) > 0 and \
     st.session_state.synthesize_zip_info:
         
         # 提取zip信息（避免键不存在报错）
@@ -1335,7 +1124,7 @@ with st.sidebar:
         
         st.download_button(
             label=f"下载所有合成图片",
-            data=st.session_state.synthesize_zip_buffer,
+            data=download_data(archive_reader(st.session_state.synthesize_zip_buffer)),
             file_name=f"产品图合成_{zip_output_size}px_{zip_output_format.lower()}.zip",
             mime="application/zip",
             use_container_width=True,
@@ -1397,13 +1186,13 @@ with tab1:
                         if idx < preview_count:
                             with cols[j]:
                                 file = bg_files[idx]
-                                img = Image.open(file)
                                 display_width = 150
-                                ratio = display_width / img.width
-                                display_height = int(img.height * ratio)
                                 
-                                display_img = img.copy()
-                                display_img.thumbnail((display_width, display_height * 2), Image.Resampling.LANCZOS)
+                                # 从解码缓存读取缩略图（按宽度缩放，每张图只解码一次）
+                                display_img = decode_cache.thumbnail(
+                                    file.getvalue(), (display_width, display_width * 4),
+                                    digest=upload_digest(file), session_id=st.session_state.session_id
+                                )
                                 
                                 st.image(
                                     display_img, 
@@ -1412,7 +1201,8 @@ with tab1:
                                 )
         
         else:  # Unsplash图库
-            # 初始化Unsplash API（提前初始化，避免重复定义）
+            # 初始化Unsplash API（提前初始化，避免重复定义）；客户端模块（requests 等）选择图库时才导入
+            from unsplash_client import thumbnail_url, UnsplashPhoto
             unsplash_api = UnsplashAPI()
             
             # ===================== 关键修改1：先执行搜索/分页逻辑（在按钮渲染前） =====================
@@ -1543,6 +1333,14 @@ with tab1:
 
                 photos = st.session_state.unsplash_photos
                 
+                # 当前页缩略图从缓存读取（未缓存的并行下载）并内嵌到页面中，浏览器不必再逐张请求；
+                # 同时在后台预取相邻两页的搜索结果和缩略图，翻页时直接命中缓存
+                thumbnail_urls = [thumbnail_url(photo) for photo in photos]
+                thumbnails = {}
+                if unsplash_api.client:
+                    thumbnails = unsplash_api.client.fetch_many([url for url in thumbnail_urls if url])
+                    unsplash_api.client.prefetch(st.session_state.unsplash_search_query, current_page, total_pages)
+                
                 # 每排6个，显示2排（共12个）
                 rows = 2
                 cols_per_row = 6
@@ -1557,16 +1355,22 @@ with tab1:
                             with columns[col]:
                                 photo = photos[idx]
                                 img_url = photo.get("urls", {}).get("small")
+                                thumb_url = thumbnail_urls[idx]
+                                if thumb_url in thumbnails:
+                                    thumb_src = "data:image/jpeg;base64," + \
+                                        base64.b64encode(thumbnails[thumb_url]).decode()
+                                else:
+                                    thumb_src = thumb_url
                                 
                                 if img_url:
-                                    # 判断当前图片是否为选中状态
-                                    is_selected = (st.session_state.unsplash_selected_page == current_page) and \
-                                                (st.session_state.unsplash_selected_idx == idx)
+                                    # 判断当前图片是否为选中状态（按图片ID，翻页、重新搜索后仍保持）
+                                    photo_id = photo.get("id") or img_url
+                                    is_selected = photo_id in st.session_state.unsplash_selected_bgs
                                     
                                     # 1. 显示图片（无点击功能）使用CSS实现1:1裁剪
                                     st.markdown(f"""
                                     <div class="unsplash-square-container">
-                                        <img src="{img_url}" alt="Unsplash图片" class="unsplash-square-image">
+                                        <img src="{thumb_src}" alt="Unsplash图片" class="unsplash-square-image">
                                     </div>
                                     """, unsafe_allow_html=True)
                                     
@@ -1581,27 +1385,31 @@ with tab1:
                                         use_container_width=True,
                                         type="primary" if is_selected else "secondary"
                                     ):
-                                        # 1. 静默更新选中状态（无任何页面输出）
-                                        st.session_state.unsplash_selected_page = current_page
-                                        st.session_state.unsplash_selected_idx = idx
-                                        
-                                        # 2. 静默下载图片（无spinner提示）
-                                        img = unsplash_api.download_photo(img_url)
-                                        if img:
-                                            class MockFile:
-                                                def __init__(self, img, idx, page):
-                                                    self.name = f"unsplash_bg_{page}_{idx}.jpg"
-                                                    self.type = "image/jpeg"
-                                                    self.image = img
-                                                    self.idx = idx
-                                                    self.page = page
-                                            
-                                            mock_file = MockFile(img, idx, current_page)
-                                            st.session_state.unsplash_selected_bg = mock_file
+                                        # 1. 再次点击取消选择
+                                        if is_selected:
+                                            del st.session_state.unsplash_selected_bgs[photo_id]
+                                        else:
+                                            # 2. 在后台下载合成输出尺寸的裁剪图（不阻塞页面，多张并发下载，合成时直接使用）
+                                            st.session_state.unsplash_selected_bgs[photo_id] = UnsplashPhoto(
+                                                unsplash_api.client, photo, f"unsplash_{photo_id}.jpg",
+                                                st.session_state.get('output_size', 800)
+                                            )
                                         
                                         # 3. 静默刷新页面（无成功提示）
                                         st.rerun()
 
+            # 已选择的Unsplash背景（跨页累计）
+            selected_bgs = st.session_state.unsplash_selected_bgs
+            if selected_bgs:
+                count_col, clear_col = st.columns([3, 1])
+                with count_col:
+                    ready_count = sum(1 for photo in selected_bgs.values() if photo.ready)
+                    st.caption(f"已选择 {len(selected_bgs)} 张Unsplash背景（已下载 {ready_count} 张），可翻页继续选择")
+                with clear_col:
+                    if st.button("清空选择", key="unsplash_clear_selection", use_container_width=True):
+                        st.session_state.unsplash_selected_bgs = {}
+                        st.rerun()
+
     with col2:
         # 产品图上传逻辑（完整补全，解决 uploaded_products 未定义错误）
         st.markdown("#### 产品图上传")
@@ -1650,11 +1458,11 @@ with tab1:
             for idx in range(preview_count):
                 with cols[idx]:
                     file = product_files[idx]
-                    img = Image.open(file)
                     
+                    # 从解码缓存读取缩略图（每张图每个尺寸只解码、缩放一次）
                     display_width = 120
-                    display_img = img.copy()
-                    display_img.thumbnail((display_width, display_width), Image.Resampling.LANCZOS)
+                    display_img = decode_cache.thumbnail(file.getvalue(), (display_width, display_width), 'RGBA',
+                                                         upload_digest(file), st.session_state.session_id)
                     
                     st.image(
                         display_img,
@@ -1671,8 +1479,8 @@ with tab1:
     if 'bg_files' in locals() and bg_files:
         bg_files_combined.extend(bg_files)
     
-    if 'unsplash_selected_bg' in st.session_state and st.session_state.unsplash_selected_bg:
-        bg_files_combined.append(st.session_state.unsplash_selected_bg)
+    if 'unsplash_selected_bgs' in st.session_state:
+        bg_files_combined.extend(st.session_state.unsplash_selected_bgs.values())
     
     if bg_files_combined and product_files:
         total_combinations = len(bg_files_combined) * len(product_files)
@@ -1694,15 +1502,12 @@ with tab1:
         for idx in range(preview_count):
             with cols[idx]:
                 preview_data = preview_images[idx]
-                img = Image.open(preview_data["data"])
                 
-                # 优化：缩小图片宽度到110px，保证10张图不超出页面，紧凑显示
+                # 优化：缩小图片宽度到110px，保证10张图不超出页面，紧凑显示（缩略图在合成时已生成）
                 display_width = 110
-                display_img = img.copy()
-                display_img.thumbnail((display_width, display_width), Image.Resampling.LANCZOS)
                 
                 st.image(
-                    display_img,
+                    preview_data["thumbnail"],
                     caption=preview_data["filename"][:10] + "..." if len(preview_data["filename"]) > 10 else preview_data["filename"],
                     width=display_width
                 )
@@ -1716,6 +1521,133 @@ with tab1:
         st.info("✅ 合成完成！可下载ZIP包查看全部图片")
 
 # 标签页2：视频抽帧
+def _unique_path(directory, filename):
+    """目录中已有同名文件时追加序号"""
+    stem, ext = os.path.splitext(filename)
+    path, n = os.path.join(directory, filename), 1
+    while os.path.exists(path):
+        n += 1
+        path = os.path.join(directory, f"{stem}_{n}{ext}")
+    return path
+
+def render_video_batch(batch_files):
+    """tab2 批量模式：多个视频并行抽帧，结果逐个写入ZIP或输出目录"""
+    from video_engine import (default_video_workers, cleanup_stale_workspaces, job_workspace, iter_video_results,
+                              resolve_output_dir, OUTPUT_ROOT)
+    
+    st.markdown("#### 2. 批量处理设置")
+    smart_render = st.checkbox(
+        "智能渲染（只重新编码被删帧所在的片段）",
+        value=True,
+        key="video_batch_smart_render",
+        help="仅支持H.264视频，其余片段和音频直接复制；不支持时自动整段重新编码"
+    )
+    output_mode = st.radio(
+        "输出方式",
+        ["打包ZIP下载", "保存到输出目录"],
+        horizontal=True,
+        key="video_batch_output_mode"
+    )
+    output_dir = None
+    output_dir_error = None
+    if output_mode == "保存到输出目录":
+        # 输出根目录由服务器配置（VIDEO_OUTPUT_DIR），页面只能选择其下的子目录
+        subfolder = st.text_input(
+            f"子目录（可选，保存在输出目录 {OUTPUT_ROOT} 下）",
+            value="",
+            key="video_batch_output_dir"
+        )
+        try:
+            output_dir = resolve_output_dir(subfolder)
+        except ValueError as e:
+            output_dir_error = str(e)
+            st.error(output_dir_error)
+    workers = min(default_video_workers(), len(batch_files))
+    st.caption(f"共 {len(batch_files)} 个视频 | 同时处理 {workers} 个")
+    
+    if st.button("🎬 开始批量抽帧", type="primary", use_container_width=True, key="process_video_batch",
+                 disabled=output_dir_error is not None):
+        # 释放上一次的压缩包
+        release_archive(st.session_state.video_batch_zip)
+        st.session_state.video_batch_zip = None
+        st.session_state.video_batch_summary = None
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        
+        cleanup_stale_workspaces()
+        with job_workspace("batch") as workdir:
+            # 上传文件分块写入临时目录，输出文件也先写在临时目录，完成后立即移走
+            jobs = []
+            for index, video in enumerate(batch_files):
+                input_path = os.path.join(workdir, f"input_{index:03d}{os.path.splitext(video.name)[1]}")
+                video.seek(0)
+                with open(input_path, 'wb') as f:
+                    shutil.copyfileobj(video, f, 1024 * 1024)
+                jobs.append((video.name, input_path, os.path.join(workdir, f"output_{index:03d}.mp4"),
+                             upload_digest(video)))
+            
+            overall_bar = st.progress(0)
+            file_bars = [st.progress(0, text=f"⏳ {name}") for name, _, _, _ in jobs]
+            progress = {}
+            
+            def refresh():
+                for index, fraction in list(progress.items()):
+                    if fraction < 1.0:
+                        file_bars[index].progress(fraction, text=f"🎬 {jobs[index][0]} - {fraction * 100:.0f}%")
+            
+            zip_writer = None if output_dir else ZipStreamWriter()
+            summary = []
+            for done, result in enumerate(iter_video_results(jobs, smart=smart_render, progress=progress,
+                                                             on_tick=refresh), 1):
+                os.remove(jobs[result.index][1])
+                if result.error:
+                    file_bars[result.index].progress(1.0, text=f"❌ {result.name}: {result.error[:200]}")
+                    summary.append({"文件": result.name, "状态": f"失败: {result.error[:200]}"})
+                else:
+                    output_name = f"{os.path.splitext(result.name)[0]}_抽帧版.mp4"
+                    if zip_writer:
+                        output_name = zip_writer.add_file(result.output_path, output_name)
+                        os.remove(result.output_path)
+                    else:
+                        target = _unique_path(output_dir, output_name)
+                        shutil.move(result.output_path, target)
+                        output_name = target
+                    frames = result.frames_removed
+                    file_bars[result.index].progress(1.0, text=f"✅ {result.name}")
+                    summary.append({
+                        "文件": result.name,
+                        "状态": "成功",
+                        "输出": output_name,
+                        "删除的帧": f"{frames[0]}, {frames[1]}",
+                        "新帧数": result.saved_frames,
+                        "处理方式": "智能渲染" if result.video_info["render_mode"] == "smart" else "整段重新编码",
+                        "音频": "无" if result.audio_mode == "none" else result.audio_mode,
+                    })
+                overall_bar.progress(done / len(jobs), text=f"已完成 {done}/{len(jobs)}")
+            
+            if zip_writer:
+                st.session_state.video_batch_zip = zip_writer.finish()
+            st.session_state.video_batch_summary = summary
+    
+    summary = st.session_state.video_batch_summary
+    if summary:
+        succeeded = sum(1 for row in summary if row["状态"] == "成功")
+        st.success(f"✅ 批量处理完成：成功 {succeeded} 个，失败 {len(summary) - succeeded} 个")
+        st.dataframe(summary, use_container_width=True, hide_index=True)
+    
+    archive = st.session_state.video_batch_zip
+    if archive_size(archive) > 0:
+        st.markdown("#### 3. 下载结果")
+        st.info(f"压缩包大小: {archive_size(archive) / 1024 / 1024:.1f} MB")
+        st.download_button(
+            label="📥 下载全部视频 (ZIP)",
+            data=download_data(archive_reader(archive)),
+            file_name="videos_抽帧版.zip",
+            mime="application/zip",
+            use_container_width=True,
+            key="download_video_batch"
+        )
+
 with tab2:
     st.header("🎬 视频抽帧")
     st.markdown(
@@ -1728,30 +1660,57 @@ with tab2:
     
     with col_left_video:
         st.markdown("#### 1. 上传视频")
-        video_file = st.file_uploader(
-            "选择需要处理的视频", 
-            type=['mp4', 'avi', 'mov', 'mkv', 'flv', 'wmv'], 
-            key="video_uploader",
-            help="支持MP4、AVI、MOV、MKV等常见视频格式",
+        
+        # 处理模式：单个视频 / 批量处理
+        video_mode = st.radio(
+            "处理模式",
+            ["单个视频", "批量处理"],
+            horizontal=True,
+            key="video_mode",
             label_visibility="collapsed"
         )
+        video_file = None
+        batch_video_files = []
+        
+        if video_mode == "单个视频":
+            video_file = st.file_uploader(
+                "选择需要处理的视频", 
+                type=['mp4', 'avi', 'mov', 'mkv', 'flv', 'wmv'], 
+                key="video_uploader",
+                help="支持MP4、AVI、MOV、MKV等常见视频格式",
+                label_visibility="collapsed"
+            )
+        else:
+            batch_video_files = st.file_uploader(
+                "选择需要处理的视频（可多选）",
+                type=['mp4', 'avi', 'mov', 'mkv', 'flv', 'wmv'],
+                accept_multiple_files=True,
+                key="video_batch_uploader",
+                help="一次上传多个视频，并行处理后打包下载或保存到输出目录",
+                label_visibility="collapsed"
+            ) or []
+            if batch_video_files:
+                st.success(f"已上传 {len(batch_video_files)} 个视频")
+                for video in batch_video_files:
+                    st.caption(f"• {video.name}（{video.size / (1024*1024):.1f} MB）")
         
         if video_file:
-            # 保存上传的视频到临时文件
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_file:
-                tmp_file.write(video_file.getvalue())
-                temp_video_path = tmp_file.name
+            # 视频处理模块（imageio_ffmpeg 等）在上传视频后才导入，只用图片功能时不加载；
+            # 右侧处理设置栏同样只在上传视频后渲染，直接使用这里导入的名称
+            from video_engine import (probe_cache, stage_upload, create_workspace, release_workspace,
+                                      cleanup_stale_workspaces, PREVIEW_MAX_BYTES)
             
-            # 显示视频信息
+            # 分块复制到以内容哈希命名的文件，重新运行时直接复用（不整体复制到内存）
+            video_digest = upload_digest(video_file)
+            temp_video_path = stage_upload(video_file, video_file.name, video_digest)
+            
+            # 显示视频信息（按内容哈希缓存，重新运行时不再读取文件）
             try:
-                cap = cv2.VideoCapture(temp_video_path)
-                if cap.isOpened():
-                    fps = cap.get(cv2.CAP_PROP_FPS)
-                    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                    duration = total_frames / fps if fps > 0 else 0
-                    cap.release()
+                probed = probe_cache.probe(temp_video_path, video_digest)
+                if probed["fps"] > 0 and probed["width"] > 0:
+                    codecs = probed["codec"] or "未知"
+                    if probed["audio_codec"]:
+                        codecs += f" / {probed['audio_codec']}"
                     
                     st.markdown("视频信息")
                     st.markdown(f"""
@@ -1759,18 +1718,22 @@ with tab2:
                         <div class="video-info-title">📊 视频详情</div>
                         <div class="video-info-text">
                             • 文件名: {video_file.name}<br>
-                            • 分辨率: {width} × {height}<br>
-                            • 帧率: {fps:.2f} FPS<br>
-                            • 总帧数: {total_frames} 帧<br>
-                            • 时长: {duration:.2f} 秒<br>
+                            • 分辨率: {probed['width']} × {probed['height']}<br>
+                            • 帧率: {probed['fps']:.2f} FPS<br>
+                            • 总帧数: {probed['total_frames']} 帧<br>
+                            • 时长: {probed['duration']:.2f} 秒<br>
+                            • 编码: {codecs}（关键帧 {len(probed['keyframes'])} 个）<br>
                             • 文件大小: {video_file.size / (1024*1024):.2f} MB
                         </div>
                     </div>
                     """, unsafe_allow_html=True)
                     
-                    # 预览视频
+                    # 预览视频（st.video 会把整个文件读入内存，过大的视频不预览）
                     st.markdown("视频预览")
-                    st.video(video_file)
+                    if video_file.size <= PREVIEW_MAX_BYTES:
+                        st.video(temp_video_path)
+                    else:
+                        st.caption("视频较大，不在页面中预览")
                 else:
                     st.warning("无法读取视频信息，请检查视频格式是否支持。")
             except Exception as e:
@@ -1789,6 +1752,13 @@ with tab2:
             - 适合用于应对平台重复检测"""
             )
             
+            smart_render = st.checkbox(
+                "智能渲染（只重新编码被删帧所在的片段）",
+                value=True,
+                key="video_smart_render",
+                help="仅支持H.264视频，其余片段和音频直接复制，长视频处理速度大幅提升；不支持时自动整段重新编码"
+            )
+            
             # 处理按钮
             if st.button("🎬 开始视频抽帧处理", type="primary", use_container_width=True, key="process_video"):
                 with st.spinner('正在处理视频...'):
@@ -1796,30 +1766,34 @@ with tab2:
                     progress_bar = st.progress(0)
                     status_text = st.empty()
                     
-                    # 生成输出文件名
+                    # 生成输出文件名；结果写在本会话独立的临时目录中，下载时直接从磁盘读取
                     output_filename = f"{os.path.splitext(video_file.name)[0]}_抽帧版.mp4"
+                    cleanup_stale_workspaces()
+                    if st.session_state.video_info:
+                        release_workspace(st.session_state.video_info.get("result_dir"))
+                    st.session_state.processed_video = None
+                    st.session_state.video_info = None
+                    result_dir = create_workspace("result")
                     
                     try:
                         # 调用视频处理函数
                         output_path, video_info, frames_removed, saved_frames = remove_random_frames(
-                            temp_video_path, output_filename, progress_bar, status_text
+                            temp_video_path, os.path.join(result_dir, "output.mp4"), progress_bar, status_text,
+                            smart=smart_render, digest=video_digest
                         )
                         
                         # 更新进度条
                         progress_bar.progress(1.0)
                         status_text.empty()
                         
-                        # 读取处理后的视频文件
-                        with open(output_path, 'rb') as f:
-                            video_data = f.read()
-                        
-                        # 保存到session_state
-                        st.session_state.processed_video = video_data
+                        # 保存到session_state（只保存输出文件路径）
+                        st.session_state.processed_video = output_path
                         st.session_state.video_info = {
                             "original_info": video_info,
                             "frames_removed": frames_removed,
                             "saved_frames": saved_frames,
-                            "output_filename": output_filename
+                            "output_filename": output_filename,
+                            "result_dir": result_dir
                         }
                         
                         st.success(f"✅ 视频处理完成！")
@@ -1836,27 +1810,33 @@ with tab2:
                                 • 删除帧数: {video_info['total_frames'] - saved_frames} 帧<br>
                                 • 分辨率: {video_info['width']} × {video_info['height']}<br>
                                 • 帧率: {video_info['fps']:.2f} FPS<br>
-                                • 时长: {video_info['duration']:.2f} 秒
+                                • 时长: {video_info['duration']:.2f} 秒<br>
+                                • 处理方式: {"智能渲染（仅重新编码受影响片段）" if video_info['render_mode'] == "smart" else "整段重新编码"}
                             </div>
                         </div>
                         """, unsafe_allow_html=True)
                         
                         # 预览处理后的视频
                         st.markdown("处理后的视频预览")
-                        st.video(video_data)
+                        if os.path.getsize(output_path) <= PREVIEW_MAX_BYTES:
+                            st.video(output_path)
+                        else:
+                            st.caption("视频较大，不在页面中预览，请下载查看")
                         
                     except Exception as e:
+                        release_workspace(result_dir)
                         progress_bar.empty()
                         status_text.empty()
                         st.error(f"处理视频时出错: {e}")
-                    finally:
-                        # 清理临时文件
-                        if os.path.exists(temp_video_path):
-                            os.unlink(temp_video_path)
-                        if os.path.exists(output_filename):
-                            os.unlink(output_filename)
             
             # 显示下载按钮（如果已处理）
+            if (st.session_state.processed_video and st.session_state.video_info
+                    and not os.path.exists(st.session_state.processed_video)):
+                # 长时间未使用的结果文件已被定期清理
+                st.warning("处理结果已过期，请重新处理")
+                st.session_state.processed_video = None
+                st.session_state.video_info = None
+            
             if st.session_state.processed_video and st.session_state.video_info:
                 st.markdown("#### 3. 下载结果")
                 
@@ -1864,10 +1844,10 @@ with tab2:
                 video_info = st.session_state.video_info
                 output_filename = video_info["output_filename"]
                 
-                # 下载按钮
+                # 下载按钮（点击时才从磁盘文件读取）
                 st.download_button(
                     label=f"📥 下载处理后的视频 ({output_filename})",
-                    data=st.session_state.processed_video,
+                    data=download_data(file_reader(st.session_state.processed_video)),
                     file_name=output_filename,
                     mime="video/mp4",
                     use_container_width=True,
@@ -1879,12 +1859,84 @@ with tab2:
                 st.markdown("#### 🔄 批量处理")
                 
                 if st.button("🔄 使用相同设置处理另一个视频", key="process_another"):
-                    # 重置状态
+                    # 重置状态，删除上一次的结果文件
+                    release_workspace(st.session_state.video_info.get("result_dir"))
                     st.session_state.processed_video = None
                     st.session_state.video_info = None
                     st.rerun()
+        elif batch_video_files:
+            render_video_batch(batch_video_files)
 
 # 标签页3：Logo水印添加
+def render_logo_batch(batch_files):
+    """tab3 批量模式：并行加水印，结果逐张写入ZIP"""
+    logo_path = "logos/b_logo.png" if st.session_state.logo_adder_logo_color == "黑色Logo" else "logos/w_logo.png"
+    if not os.path.exists(logo_path):
+        st.warning(f"⚠️ 未找到Logo文件: {logo_path}")
+        st.warning("请在 logos 文件夹中提供 b_logo.png 和 w_logo.png 文件")
+        return
+    
+    try:
+        sources = list_watermark_sources(batch_files)
+    except zipfile.BadZipFile:
+        st.error("ZIP压缩包已损坏，无法读取")
+        return
+    
+    st.markdown("### 4. 批量处理")
+    if not sources:
+        st.warning("上传的文件中没有可处理的JPG/PNG图片")
+        return
+    
+    output_format = st.radio(
+        "输出格式",
+        ["JPG", "PNG"],
+        horizontal=True,
+        key="logo_adder_batch_format"
+    )
+    st.caption(f"共 {len(sources)} 张图片 | Logo大小: {st.session_state.logo_adder_logo_size}% | "
+               f"透明度: {int(st.session_state.logo_adder_logo_opacity/255*100)}%")
+    
+    if st.button("🚀 开始批量添加Logo", type="primary", use_container_width=True, key="logo_adder_batch_button"):
+        # 释放上一次的压缩包
+        release_archive(st.session_state.logo_adder_last_zip_buffer)
+        st.session_state.logo_adder_last_zip_buffer = None
+        
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        settings = (
+            st.session_state.logo_adder_logo_x,
+            st.session_state.logo_adder_logo_y,
+            st.session_state.logo_adder_logo_size,
+            st.session_state.logo_adder_logo_opacity
+        )
+        zip_writer = ZipStreamWriter()
+        failed = []
+        results = iter_watermark_results(sources, Image.open(logo_path), settings, output_format)
+        for done, result in enumerate(results, 1):
+            if result.error:
+                failed.append(f"{result.name}: {result.error}")
+            else:
+                zip_writer.add(result.arcname, result.data)
+            progress_bar.progress(done / len(sources))
+            status_text.text(f"正在处理: {done}/{len(sources)} - {result.name}")
+        
+        st.session_state.logo_adder_last_zip_buffer = zip_writer.finish()
+        status_text.text(f"✅ 处理完成：成功 {zip_writer.count} 张，失败 {len(failed)} 张")
+        for message in failed[:10]:
+            st.caption(f"❌ {message}")
+    
+    archive = st.session_state.logo_adder_last_zip_buffer
+    if archive_size(archive) > 0:
+        st.info(f"压缩包大小: {archive_size(archive) / 1024 / 1024:.1f} MB")
+        st.download_button(
+            label="📥 下载全部图片 (ZIP)",
+            data=download_data(archive_reader(archive)),
+            file_name="images_with_logo.zip",
+            mime="application/zip",
+            use_container_width=True,
+            key="download_logo_adder_batch"
+        )
+
 with tab3:
     # 预设位置映射表
     preset_map = {
@@ -1902,7 +1954,7 @@ with tab3:
     st.header("🖼️ Logo水印添加")
     st.markdown(
     """<div class="highlight-box">
-        <p>为单张图片添加LOGO水印，支持自定义LOGO位置、大小和透明度。</p>
+        <p>为图片添加LOGO水印，支持自定义LOGO位置、大小和透明度；批量模式可一次处理多张图片或ZIP压缩包。</p>
     </div>""", unsafe_allow_html=True)
     
     # 使用三列布局
@@ -1911,15 +1963,39 @@ with tab3:
     with col_left:
         st.markdown("### 1. 上传图片")
         
-        # 上传图片 - 单张模式
-        uploaded_image = st.file_uploader(
-            "选择需要添加Logo的图片",
-            type=['png', 'jpg', 'jpeg'],
-            accept_multiple_files=False,
-            key="logo_adder_uploader",
-            help="支持JPG和PNG格式，单张处理模式",
+        # 处理模式：单张实时预览 / 批量打包下载
+        logo_adder_mode = st.radio(
+            "处理模式",
+            ["单张处理", "批量处理"],
+            horizontal=True,
+            key="logo_adder_mode",
             label_visibility="collapsed"
         )
+        uploaded_image = None
+        batch_files = []
+        
+        if logo_adder_mode == "单张处理":
+            # 上传图片 - 单张模式
+            uploaded_image = st.file_uploader(
+                "选择需要添加Logo的图片",
+                type=['png', 'jpg', 'jpeg'],
+                accept_multiple_files=False,
+                key="logo_adder_uploader",
+                help="支持JPG和PNG格式，单张处理模式",
+                label_visibility="collapsed"
+            )
+        else:
+            # 上传图片 - 批量模式（多张图片或ZIP压缩包）
+            batch_files = st.file_uploader(
+                "选择需要添加Logo的图片或ZIP压缩包",
+                type=['png', 'jpg', 'jpeg', 'zip'],
+                accept_multiple_files=True,
+                key="logo_adder_batch_uploader",
+                help="支持多张JPG/PNG图片，或包含图片的ZIP压缩包",
+                label_visibility="collapsed"
+            ) or []
+            if batch_files:
+                st.success(f"已上传 {len(batch_files)} 个文件")
         
         if uploaded_image:
             # 保存到session_state
@@ -2063,37 +2139,28 @@ with tab3:
                 logo_img = Image.open(logo_path)
                 st.session_state.logo_adder_logo_image = logo_img
                 
-                # 处理图片
-                original_img = Image.open(uploaded_image)
-                processed_result = add_logo_to_image(
-                    original_img,
-                    logo_img,
+                logo_settings = (
                     st.session_state.logo_adder_logo_x,
                     st.session_state.logo_adder_logo_y,
                     st.session_state.logo_adder_logo_size,
                     st.session_state.logo_adder_logo_opacity
                 )
                 
-                if processed_result:
-                    # 保存处理后的结果到session_state
-                    st.session_state.logo_adder_processed_result = processed_result
-                    
+                # 实时预览：在缓存的显示尺寸代理图上加水印，不处理原图
+                try:
+                    proxy_img, (original_width, original_height) = preview_proxy(
+                        uploaded_image.getvalue(), upload_digest(uploaded_image),
+                        session_id=st.session_state.session_id
+                    )
+                    preview_img = render_preview(proxy_img, logo_img, *logo_settings)
+                except Exception as e:
+                    st.error(f"添加Logo时发生错误: {e}")
+                    preview_img = None
+                
+                if preview_img:
                     # 实时预览区域 - 放大预览
                     st.markdown("### 4. 实时预览")
                     
-                    # 计算显示尺寸 - 放大预览
-                    display_width = 600  # 放大预览尺寸
-                    
-                    # 获取原始图片尺寸
-                    original_width, original_height = processed_result.size
-                    
-                    # 计算按比例缩放的高度
-                    display_height = int(original_height * (display_width / original_width))
-                    
-                    # 创建高质量的预览图
-                    preview_img = processed_result.copy()
-                    preview_img.thumbnail((display_width, display_height), Image.Resampling.LANCZOS)
-                    
                     # 显示放大预览
                     st.image(preview_img, caption="添加Logo后的效果预览", use_column_width=True)
                     
@@ -2109,45 +2176,36 @@ with tab3:
                     # 下载按钮 - 直接下载单张JPG
                     st.markdown("### 5. 下载结果")
                     
-                    # 将处理结果转换为JPG格式
-                    jpg_buffer = BytesIO()
-                    
-                    # 如果是RGBA模式，转换为RGB
-                    if processed_result.mode == 'RGBA':
-                        rgb_img = Image.new('RGB', processed_result.size, (255, 255, 255))
-                        rgb_img.paste(processed_result, mask=processed_result.split()[3])
-                        result_to_save = rgb_img
-                    else:
-                        result_to_save = processed_result
-                    
-                    # 保存为JPG，高质量
-                    result_to_save.save(jpg_buffer, format='JPEG', quality=95)
-                    jpg_buffer.seek(0)
-                    
                     # 生成下载文件名
                     original_name = os.path.splitext(uploaded_image.name)[0]
                     download_filename = f"{original_name}_with_logo.jpg"
                     
-                    # 显示文件大小信息
-                    file_size_kb = len(jpg_buffer.getvalue()) / 1024
-                    st.info(f"文件大小: {file_size_kb:.1f} KB | 格式: JPG | 质量: 95%")
+                    # 原图分辨率的处理和JPG编码在点击下载时才执行（结果不保存在会话中）
+                    def watermarked_reader(image_file=uploaded_image, logo=logo_img, settings=logo_settings):
+                        result = run_watermark_task(0, image_file.name, image_file.getvalue(), logo, settings, 'JPG')
+                        if result.error:
+                            raise RuntimeError(f"添加Logo时发生错误: {result.error}")
+                        return result.data
                     
-                    # 下载按钮
-                    st.download_button(
-                        label="📥 下载处理后的图片 (JPG格式)",
-                        data=jpg_buffer,
-                        file_name=download_filename,
-                        mime="image/jpeg",
-                        use_container_width=True,
-                        key="download_logo_adder"
-                    )
+                    st.info(f"输出尺寸: {original_width} × {original_height} 像素 | 格式: JPG | 质量: 95%")
+                    # 旧版Streamlit不支持延迟下载，先点击生成，避免每次调整设置都按原图处理
+                    if DEFERRED_DOWNLOAD or st.button("⚙️ 生成下载文件 (原图分辨率)", use_container_width=True,
+                                                      key="generate_logo_adder"):
+                        st.download_button(
+                            label="📥 下载处理后的图片 (JPG格式)",
+                            data=download_data(watermarked_reader),
+                            file_name=download_filename,
+                            mime="image/jpeg",
+                            use_container_width=True,
+                            key="download_logo_adder"
+                        )
                     
                     # 添加快捷提示
                     st.markdown("---")
                     col_tip1, col_tip2, col_tip3 = st.columns(3)
                     with col_tip1:
                         st.markdown("💡 小贴士")
-                        st.caption("• 调整设置后实时预览")
+                        st.caption("• 调整设置后实时预览，点击下载时才按原图处理")
                     with col_tip2:
                         st.markdown("⚡ 快速操作")
                         st.caption("• 使用预设位置快速定位")
@@ -2155,6 +2213,9 @@ with tab3:
                         st.markdown("🔧 高级设置")
                         st.caption("• 自定义位置精确定位")
         
+        elif batch_files:
+            render_logo_batch(batch_files)
+        
         else:
             # 未上传图片时的提示
             st.markdown("### 4. 预览区域")
@@ -2177,9 +2238,9 @@ if process_button:
     if 'bg_files' in locals() and bg_files:
         bg_files_combined.extend(bg_files)
     
-    # 获取Unsplash选择的背景文件
-    if 'unsplash_selected_bg' in st.session_state and st.session_state.unsplash_selected_bg:
-        bg_files_combined.append(st.session_state.unsplash_selected_bg)
+    # 获取Unsplash选择的背景文件（可多选）
+    if 'unsplash_selected_bgs' in st.session_state:
+        bg_files_combined.extend(st.session_state.unsplash_selected_bgs.values())
     
     # ✅ 核心修改：从session_state中读取持久化的产品图
     product_files = st.session_state.persist_product_files
@@ -2212,7 +2273,8 @@ if process_button:
         logo_path = "logos/white_logo.png"
     
     if os.path.exists(logo_path):
-        logo_to_use = Image.open(logo_path)
+        # 已缩放到输出尺寸的Logo图层（相同设置的任务之间复用）
+        logo_to_use = overlay_cache.logo_layer(logo_path, output_size)
     else:
         st.warning(f"⚠️ 未找到{logo_color}文件：{logo_path}")
         st.warning("请在 logos 文件夹中提供 black_logo.png 和 white_logo.png 文件")
@@ -2224,107 +2286,130 @@ if process_button:
         mask_color_name = st.session_state.get('mask_preset_color', '自定义颜色')
         st.info(f"🖌️ 背景遮罩已启用 | 颜色: {mask_color_name} ({mask_hex}) | 不透明度: {mask_opacity}%")
     
-    # 创建临时目录存放结果
-    with tempfile.TemporaryDirectory() as tmpdir:
-        output_files = []
-        # ✅ 关键修正：在使用前初始化 preview_images 为空列表（必须在循环外层）
-        preview_images = []  # 这一行是解决 NameError 的核心，不能缺失
-
-        total = len(bg_files_combined) * len(product_files)
-        
-        # 进度条
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        processed = 0
-        for i, bg_file in enumerate(bg_files_combined):
-            # 处理背景文件（可能是上传的文件或Unsplash文件）
-            if hasattr(bg_file, 'read'):  # 上传的文件
-                bg_image = Image.open(bg_file)
-            elif hasattr(bg_file, 'image'):  # Unsplash文件
-                bg_image = bg_file.image
-            else:
-                continue
-            
-            for j, product_file in enumerate(product_files):
-                product_image = Image.open(product_file)
-                
-                # 更新进度
-                processed += 1
-                progress = processed / total
-                progress_bar.progress(progress)
-                status_text.text(f"正在处理 {processed}/{total} ({progress*100:.1f}%)")
-                
-                # 调用合成函数（添加遮罩参数，产品图位置固定为居中）
-                result = compose_image(
-                    bg_image, product_image, logo_to_use,
-                    product_size, output_size, output_format,
-                    mask_enabled=dark_mask_enabled,
-                    mask_color=mask_color_rgb,
-                    mask_opacity=mask_opacity
-                )
-                
-                # 保存结果
-                if hasattr(bg_file, 'name'):
-                    bg_name = os.path.splitext(bg_file.name)[0]
-                else:
-                    bg_name = f"unsplash_bg_{i}"
-                
-                output_filename = f"{bg_name}_{os.path.splitext(product_file.name)[0]}.{output_format.lower()}"
-                output_path = os.path.join(tmpdir, output_filename)
-                
-                if output_format.upper() == 'JPG':
-                    result.save(output_path, format='JPEG', quality=95)
-                else:
-                    result.save(output_path, format='PNG')
-                
-                output_files.append(output_path)
-
-                # ✅ 关键：保存前24张图片到预览列表
-                if len(preview_images) < 24:
-                    img_buffer = BytesIO()
-                    if output_format.upper() == 'JPG':
-                        # RGBA转RGB避免黑底
-                        if result.mode == 'RGBA':
-                            rgb_img = Image.new('RGB', result.size, (255, 255, 255))
-                            rgb_img.paste(result, mask=result.split()[3])
-                            rgb_img.save(img_buffer, format='JPEG', quality=90)
-                        else:
-                            result.save(img_buffer, format='JPEG', quality=90)
-                    else:
-                        result.save(img_buffer, format='PNG')
-                    img_buffer.seek(0)
-                    preview_images.append({
-                        "data": img_buffer,
-                        "filename": output_filename
-                    })
-        
-        # ✅ 保存预览数据到session_state
-        st.session_state.synthesize_preview_images = preview_images
+    # 整理背景来源（可能是上传的文件或Unsplash文件），保留原序号用于命名
+    unsplash_bgs = [bg_file for bg_file in bg_files_combined if not hasattr(bg_file, 'read')]
+    if unsplash_bgs:
+        # Unsplash 客户端（requests）只在选了Unsplash背景时才导入
+        from unsplash_client import UnsplashError
+        # Unsplash图片先全部按输出尺寸发起下载（共用客户端的下载线程池并发），再逐张取结果
+        for bg_file in unsplash_bgs:
+            bg_file.request(output_size)
+    bg_entries = []
+    for i, bg_file in enumerate(bg_files_combined):
+        if hasattr(bg_file, 'read'):  # 上传的文件
+            bg_entries.append((i, bg_file, bg_file.getvalue()))
+        else:  # Unsplash图片（选择时已开始下载）
+            try:
+                bg_entries.append((i, bg_file, bg_file.data(output_size)))
+            except UnsplashError as e:
+                st.error(f"下载Unsplash背景失败: {e}")
+    if not bg_entries:
+        st.stop()
 
-        progress_bar.empty()
-        status_text.empty()
-        
-        # 打包所有文件为ZIP
-        st.toast(
-            f"✅ 合成完成！共生成 {len(output_files)} 张图片。",
-            icon="✅",  # 可选，添加图标更美观
-            duration=1  # 显示3秒后自动消失，可调整（如2/4秒）
-        )
-        zip_buffer = BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for file_path in output_files:
-                zip_file.write(file_path, os.path.basename(file_path))
-        
-        zip_buffer.seek(0)
-        # 打包所有文件为ZIP之后，添加这行保存到session_state
-        st.session_state.synthesize_zip_buffer = zip_buffer
-        st.session_state.synthesize_zip_info = {
+    # 合成任务：背景图 × 产品图，分发到进程池并行处理（产品图位置固定为居中）
+    job = ComposeJob(
+        [source for _, _, source in bg_entries],
+        [product_file.getvalue() for product_file in product_files],
+        logo_to_use,
+        {
+            "product_size": product_size,
             "output_size": output_size,
-            "output_format": output_format
+            "output_format": output_format,
+            "mask_enabled": dark_mask_enabled,
+            "mask_color": mask_color_rgb,
+            "mask_opacity": mask_opacity,
         }
+    )
+    total = job.total
+
+    # 生成每个输出的文件名
+    arcnames = {}
+    for bg_index, product_index in job.tasks():
+        i, bg_file, _ = bg_entries[bg_index]
+        product_file = product_files[product_index]
+        if hasattr(bg_file, 'name'):
+            bg_name = os.path.splitext(bg_file.name)[0]
+        else:
+            bg_name = f"unsplash_bg_{i}"
+        arcnames[(bg_index, product_index)] = \
+            f"{bg_name}_{os.path.splitext(product_file.name)[0]}.{output_format.lower()}"
+
+    # 任务目录与清单：已完成的输出直接复用，从第一个缺失的输出继续
+    cleanup_old_jobs()
+    synthesis_job = SynthesisJob(job, arcnames)
+    done_count = synthesis_job.done_count
+    if 0 < done_count < total:
+        st.toast(f"♻️ 检测到未完成的相同任务，已完成 {done_count}/{total} 张，从断点继续")
+
+    # 提交到后台任务队列后立即返回，进度由下方的轮询区域显示
+    job_queue.submit(st.session_state.session_id, synthesis_job,
+                     max_workers=st.session_state.get('compose_workers'))
+    st.rerun()
+
+# ==================== 后台合成任务进度 ====================
+def render_synthesis_progress(polling=False):
+    """显示当前会话后台合成任务的进度和部分结果；任务完成后收取结果
+
+    polling: 在定时刷新的片段中运行。任务结束后改为整页重新运行，由整页中的调用收取结果，
+    片段随之不再创建，轮询停止。
+    """
+    handle = job_queue.get(st.session_state.session_id)
+    if handle is None or handle.id == st.session_state.get('synthesis_collected_job_id'):
+        return
+
+    if handle.active:
+        status = "排队中..." if handle.status == "queued" else \
+            f"正在处理 {handle.processed}/{handle.total} ({handle.progress*100:.1f}%)"
+        st.progress(handle.progress)
+        st.text(status)
+        # 部分结果预览
+        previews = handle.previews[:10]
+        if previews:
+            cols = st.columns(10, gap="small")
+            for idx, preview_data in enumerate(previews):
+                with cols[idx]:
+                    st.image(preview_data["thumbnail"], width=110)
+        if not polling_fragment:
+            # 旧版Streamlit没有定时刷新的片段，整页定时重新运行
+            time.sleep(SYNTHESIS_POLL_SECONDS)
+            st.rerun()
+        return
+    if polling:
         st.rerun()
 
+    # 任务结束：收取结果（每个任务只收取一次）
+    st.session_state.synthesis_collected_job_id = handle.id
+    if handle.status == "failed":
+        st.error(f"合成失败: {handle.error}")
+        return
+    if handle.status == "cancelled":
+        return
+
+    # ✅ 保存预览数据到session_state（前24张，按任务顺序）
+    st.session_state.synthesize_preview_images = handle.previews
+    st.toast(
+        f"✅ 合成完成！共生成 {handle.total} 张图片。",
+        icon="✅",  # 可选，添加图标更美观
+        duration=1  # 显示3秒后自动消失，可调整（如2/4秒）
+    )
+    # 打包所有文件为ZIP之后，添加这行保存到session_state（先释放上一次的压缩包）
+    release_archive(st.session_state.synthesize_zip_buffer)
+    st.session_state.synthesize_zip_buffer = handle.archive
+    settings = handle.settings
+    st.session_state.synthesize_zip_info = {
+        "output_size": settings["output_size"],
+        "output_format": settings["output_format"]
+    }
+    st.rerun()
+
+# 有排队或运行中的任务时才定时刷新：支持定时刷新片段时只重新运行进度区域，否则退回整页刷新
+polling_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+synthesis_handle = job_queue.get(st.session_state.session_id)
+if polling_fragment and synthesis_handle is not None and synthesis_handle.active:
+    polling_fragment(run_every=SYNTHESIS_POLL_SECONDS)(render_synthesis_progress)(polling=True)
+else:
+    render_synthesis_progress()
+
 # ==================== 页脚信息 ====================
 
 st.markdown("---")
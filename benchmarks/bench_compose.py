@@ -0,0 +1,90 @@
+# benchmarks/bench_compose.py - 批量合成吞吐量基准
+"""
+测量并行合成引擎在 1、2、4、N 个工作进程下的吞吐量（张/秒），
+并校验并行结果与串行 compose_image 的输出逐字节一致。
+
+用法：python benchmarks/bench_compose.py [--backgrounds 8] [--products 12] [--output-size 800]
+"""
+import os
+import sys
+import time
+import argparse
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_engine import ComposeJob, compose_image, encode_image, iter_compose_results, load_background  # noqa: E402
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logos", "black_logo.png")
+
+
+def make_background(seed, size=(3000, 2000)):
+    """生成带渐变和色块的背景JPEG"""
+    img = Image.linear_gradient('L').resize(size).convert('RGB')
+    draw = ImageDraw.Draw(img)
+    for k in range(12):
+        x, y = (seed * 97 + k * 211) % size[0], (seed * 53 + k * 149) % size[1]
+        draw.ellipse((x, y, x + 400, y + 300), fill=((seed * 40) % 255, (k * 20) % 255, 120))
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def make_product(seed, size=(1200, 1600)):
+    """生成带透明通道的产品PNG"""
+    img = Image.new('RGBA', size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.rounded_rectangle((100, 100, size[0] - 100, size[1] - 100), radius=120,
+                           fill=((seed * 70) % 255, 90, 200, 255))
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backgrounds", type=int, default=8)
+    parser.add_argument("--products", type=int, default=12)
+    parser.add_argument("--output-size", type=int, default=800)
+    parser.add_argument("--format", default="JPG", choices=["JPG", "PNG"])
+    args = parser.parse_args()
+
+    backgrounds = [make_background(i) for i in range(args.backgrounds)]
+    products = [make_product(j) for j in range(args.products)]
+    logo = Image.open(LOGO_PATH) if os.path.exists(LOGO_PATH) else None
+    settings = {
+        "product_size": int(args.output_size * 0.75),
+        "output_size": args.output_size,
+        "output_format": args.format,
+        "mask_enabled": True,
+        "mask_color": (255, 255, 255),
+        "mask_opacity": 20,
+    }
+
+    # 串行参考结果
+    reference = {}
+    for i, bg in enumerate(backgrounds):
+        for j, product in enumerate(products):
+            result = compose_image(load_background(bg, settings["output_size"]), Image.open(BytesIO(product)), logo,
+                                   settings["product_size"], settings["output_size"], settings["output_format"],
+                                   mask_enabled=True, mask_color=(255, 255, 255), mask_opacity=20)
+            reference[(i, j)] = encode_image(result, settings["output_format"])
+
+    total = len(reference)
+    cpu = os.cpu_count() or 1
+    print(f"{args.backgrounds} 背景 × {args.products} 产品 = {total} 张，输出 {args.output_size}px {args.format}，CPU {cpu} 核")
+    print(f"{'workers':>8} {'seconds':>9} {'img/s':>8}  identical")
+    for workers in sorted({1, 2, 4, cpu}):
+        job = ComposeJob(backgrounds, products, logo, settings)
+        start = time.perf_counter()
+        identical = True
+        for result in iter_compose_results(job, max_workers=workers):
+            identical &= result.data == reference[(result.bg_index, result.product_index)]
+        elapsed = time.perf_counter() - start
+        print(f"{workers:>8} {elapsed:>9.2f} {total / elapsed:>8.1f}  {'yes' if identical else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
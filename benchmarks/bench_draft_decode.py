@@ -0,0 +1,104 @@
+# benchmarks/bench_draft_decode.py - 降低分辨率解码（JPEG draft）基准
+"""
+比较完整解码与 DCT 缩放解码（Image.draft）在两种场景下的耗时、解码内存和画质：
+背景准备（6000×4000 照片铺满 800px 画布）和预览缩略图（120/150/600px）。
+
+画质以与完整解码结果的 PSNR 表示（越高越接近，40dB以上肉眼无差别）。
+
+用法：python benchmarks/bench_draft_decode.py [--repeat 5] [--source 6000x4000]
+"""
+import os
+import sys
+import math
+import time
+import argparse
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_cache import DecodeCache, image_nbytes  # noqa: E402
+from image_engine import prepare_background  # noqa: E402
+
+CACHE_BYTES = 4 * 1024 * 1024 * 1024
+
+
+def make_photo(width, height):
+    """带细节（渐变 + 色块 + 细线）的测试照片JPEG"""
+    img = Image.merge('RGB', (
+        Image.linear_gradient('L').resize((width, height)),
+        Image.radial_gradient('L').resize((width, height)),
+        Image.linear_gradient('L').rotate(90).resize((width, height)),
+    ))
+    draw = ImageDraw.Draw(img)
+    for k in range(0, width, 37):
+        draw.line((k, 0, width - k, height), fill=(k % 255, 80, 160), width=3)
+    for k in range(40):
+        x, y = (k * 733) % width, (k * 421) % height
+        draw.ellipse((x, y, x + width // 12, y + height // 10), fill=(200, (k * 31) % 255, 60))
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def psnr(a, b):
+    diff = np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)
+    mse = float(np.mean(diff * diff))
+    return float('inf') if mse == 0 else 10 * math.log10(255 * 255 / mse)
+
+
+def timed(func, repeat):
+    """运行 repeat 次（每次使用新的空缓存），返回 (平均毫秒, 最后一次结果)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(DecodeCache(CACHE_BYTES))
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--source", default="6000x4000")
+    parser.add_argument("--output-size", type=int, default=800)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.source.split("x"))
+    data = make_photo(width, height)
+    print(f"源图 {width}×{height} JPEG，{len(data) / 1024 / 1024:.1f} MB")
+    print(f"{'case':>14} {'full ms':>9} {'draft ms':>9} {'speedup':>8} {'full MB':>8} {'draft MB':>9} {'PSNR dB':>8}")
+
+    def report(case, full_ms, draft_ms, full_img, draft_img, full_result, draft_result):
+        print(f"{case:>14} {full_ms:>9.1f} {draft_ms:>9.1f} {full_ms / draft_ms:>7.1f}x "
+              f"{image_nbytes(full_img) / 1024 / 1024:>8.1f} {image_nbytes(draft_img) / 1024 / 1024:>9.1f} "
+              f"{psnr(full_result, draft_result):>8.1f}")
+
+    # 背景准备：铺满画布
+    size = args.output_size
+    scale = size / min(width, height) * 2.0
+
+    def prepare_full(cache):
+        decoded = cache.decode(data)
+        return decoded, prepare_background(decoded, size).image
+
+    def prepare_draft(cache):
+        decoded = cache.decode_reduced(data, (width * scale, height * scale))
+        return decoded, prepare_background(decoded, size).image
+
+    full_ms, (full_img, full_bg) = timed(prepare_full, args.repeat)
+    draft_ms, (draft_img, draft_bg) = timed(prepare_draft, args.repeat)
+    report(f"bg {size}px", full_ms, draft_ms, full_img, draft_img, full_bg, draft_bg)
+
+    # 预览缩略图
+    for box in (120, 150, 600):
+        full_ms, full_thumb = timed(lambda cache: cache.thumbnail(data, (box, box), draft=False), args.repeat)
+        draft_ms, draft_thumb = timed(lambda cache: cache.thumbnail(data, (box, box)), args.repeat)
+        full_img = Image.open(BytesIO(data))
+        draft_img = Image.open(BytesIO(data))
+        draft_img.draft(None, (int(full_thumb.width * 2.0), int(full_thumb.height * 2.0)))
+        report(f"thumb {box}px", full_ms, draft_ms, full_img, draft_img, full_thumb, draft_thumb)
+
+
+if __name__ == "__main__":
+    main()
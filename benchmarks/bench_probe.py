@@ -0,0 +1,95 @@
+# benchmarks/bench_probe.py - 视频信息读取基准
+"""
+比较视频页每次重新运行读取视频信息的开销，以及各种帧数来源的准确性：
+
+- 原方式：每次重新运行用 OpenCV 打开文件读取信息卡片，处理时再 probe 一次；
+- 缓存：ProbeCache 按内容哈希缓存，首次读取包头得到精确帧数和关键帧，之后直接命中。
+
+帧数对照：时长 × 帧率估算、OpenCV CAP_PROP_FRAME_COUNT、包头计数（精确模式）、
+逐帧解码计数（基准真值）。测试视频包括恒定帧率和中途改变帧率的可变帧率视频。
+
+用法：python benchmarks/bench_probe.py [--reruns 20]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_video_drop import make_clip  # noqa: E402
+from bench_smart_render import frame_hashes  # noqa: E402
+from image_cache import content_hash  # noqa: E402
+from video_engine import ffmpeg_exe, probe_video, ProbeCache  # noqa: E402
+
+
+def make_vfr_clip(path, seconds=6):
+    """前3秒30fps、之后10fps的可变帧率视频"""
+    subprocess.run([
+        ffmpeg_exe(), "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size=640x360:rate=30:duration={seconds}",
+        "-vf", "setpts='if(lt(N,90),N/30,3+(N-90)/10)/TB'", "-fps_mode", "vfr",
+        "-c:v", "libx264", "-preset", "veryfast", path,
+    ], check=True)
+
+
+def legacy_info(path):
+    """原信息卡片：OpenCV 打开文件读取属性"""
+    import cv2
+    cap = cv2.VideoCapture(path)
+    info = (cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+    return info
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-probe-")
+    try:
+        clips = {
+            "cfr 1080p": os.path.join(workdir, "cfr.mp4"),
+            "vfr 30→10": os.path.join(workdir, "vfr.mp4"),
+        }
+        make_clip(clips["cfr 1080p"], 1920, 1080, 10)
+        make_vfr_clip(clips["vfr 30→10"])
+
+        print(f"{'clip':>10} {'estimate':>9} {'opencv':>7} {'packets':>8} {'decoded':>8}")
+        for name, path in clips.items():
+            estimate = probe_video(path)["total_frames"]
+            exact = ProbeCache().probe(path)["total_frames"]
+            print(f"{name:>10} {estimate:>9} {legacy_info(path)[1]:>7} {exact:>8} {len(frame_hashes(path)):>8}")
+
+        print(f"\n{args.reruns} 次重新运行 + 1 次处理的读取耗时")
+        print(f"{'clip':>10} {'legacy ms':>10} {'cached ms':>10} {'first ms':>9} {'hit ms':>7}")
+        for name, path in clips.items():
+            start = time.perf_counter()
+            for _ in range(args.reruns):
+                legacy_info(path)
+            probe_video(path)
+            legacy_ms = (time.perf_counter() - start) * 1000
+
+            with open(path, 'rb') as f:
+                digest = content_hash(f.read())
+            cache = ProbeCache()
+            start = time.perf_counter()
+            cache.probe(path, digest)
+            first_ms = (time.perf_counter() - start) * 1000
+            for _ in range(args.reruns):
+                cache.probe(path, digest)
+            cached_ms = (time.perf_counter() - start) * 1000
+            hit_ms = (cached_ms - first_ms) / args.reruns
+            print(f"{name:>10} {legacy_ms:>10.1f} {cached_ms:>10.1f} {first_ms:>9.1f} {hit_ms:>7.3f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# benchmarks/bench_smart_render.py - 智能渲染基准
+"""
+比较整段重新编码（drop_frames）与只重新编码受影响GOP的智能渲染（smart_drop_frames）。
+
+对不同时长的同一规格视频各删除两帧：智能渲染的耗时应基本不随视频长度增长。
+同时逐帧校验智能渲染的输出：帧数恰好少两帧，受影响GOP以外的帧与原视频解码结果逐位相同。
+
+另外不经过 ffmpeg、直接解析 MP4 的样本表检查 H.264 参数集：重新编码的片段带有自己的
+SPS/PPS（编号 SMART_RENDER_SPS_ID），只能放在样本中（带内）。avc1 样本描述要求全部参数集
+都在 avcC 中，浏览器、硬件解码器只读 avcC，遇到带内的新参数集会花屏或拒绝播放；
+avc3 才允许带内参数集，此时要求每个片段引用的 PPS/SPS 在 avcC 中或在本GOP的关键帧中出现过。
+
+用法：python benchmarks/bench_smart_render.py [--size 1920x1080] [--durations 10,30]
+"""
+import os
+import sys
+import time
+import shutil
+import struct
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_video_drop import make_clip  # noqa: E402
+from video_engine import (ffmpeg_exe, probe_video, packet_index, affected_ranges,  # noqa: E402
+                          drop_frames, smart_drop_frames)
+
+
+def frame_hashes(path):
+    """逐帧解码后的像素哈希（显示顺序）"""
+    result = subprocess.run([ffmpeg_exe(), "-v", "error", "-i", path, "-map", "0:v:0", "-fps_mode", "passthrough",
+                             "-f", "framemd5", "-"], capture_output=True, check=True)
+    if result.stderr.strip():
+        raise SystemExit(f"解码出错: {result.stderr.decode(errors='ignore')[:200]}")
+    return [line.split(',')[-1].strip() for line in result.stdout.decode().splitlines()
+            if line and not line.startswith('#')]
+
+
+def verify(original, output, frames_to_remove):
+    """返回 (帧数是否正确, 直接复制的帧是否与原视频一致)"""
+    index = packet_index(original)
+    source = frame_hashes(original)
+    result = frame_hashes(output)
+    expected = [h for n, h in enumerate(source) if n not in frames_to_remove]
+    if len(result) != len(expected):
+        return False, False
+    reencoded = set()
+    for start, end in affected_ranges(index["keyframes"], index["frame_count"], frames_to_remove):
+        reencoded.update(range(start, end))
+    kept = [n for n in range(len(source)) if n not in frames_to_remove]
+    copied_ok = all(result[i] == expected[i] for i, n in enumerate(kept) if n not in reencoded)
+    return True, copied_ok
+
+
+# ==================== MP4 参数集检查（不依赖 ffmpeg） ====================
+def _boxes(data, offset, end):
+    """遍历 [offset, end) 内的 MP4 box，产出 (类型, 内容起点, 终点)"""
+    while offset + 8 <= end:
+        size, kind = struct.unpack(">I4s", data[offset:offset + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[offset + 8:offset + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        yield kind, offset + header, offset + size
+        offset += size
+
+
+def _child(data, start, end, *path):
+    """按路径查找子 box，返回 (内容起点, 终点)，不存在时返回 None"""
+    for kind in path:
+        found = next(((s, e) for k, s, e in _boxes(data, start, end) if k == kind), None)
+        if found is None:
+            return None
+        start, end = found
+    return start, end
+
+
+def _exp_golomb(data, count):
+    """依次读取 count 个无符号指数哥伦布码（去掉防竞争字节后）"""
+    bits = "".join(f"{b:08b}" for b in data[:32].replace(b"\0\0\3", b"\0\0"))
+    values, pos = [], 0
+    for _ in range(count):
+        zeros = len(bits) - len(bits[pos:].lstrip("0")) - pos
+        values.append(int(bits[pos + zeros:pos + 2 * zeros + 1], 2) - 1)
+        pos += 2 * zeros + 1
+    return values
+
+
+def _parameter_set(nal):
+    """SPS 返回 ('sps', 编号, 无)，PPS 返回 ('pps', 编号, 引用的SPS编号)"""
+    if nal[0] & 0x1f == 7:
+        return "sps", _exp_golomb(nal[4:], 1)[0], None
+    pps_id, sps_id = _exp_golomb(nal[1:], 2)
+    return "pps", pps_id, sps_id
+
+
+def _video_samples(data):
+    """返回 (样本描述类型, avcC 中的参数集, [(是否关键帧, 样本数据)])"""
+    moov = _child(data, 0, len(data), b"moov")
+    for kind, start, end in _boxes(data, *moov):
+        if kind != b"trak":
+            continue
+        stbl = _child(data, start, end, b"mdia", b"minf", b"stbl")
+        stsd = _child(data, *stbl, b"stsd")
+        entry_size, entry = struct.unpack(">I4s", data[stsd[0] + 8:stsd[0] + 16])
+        if entry not in (b"avc1", b"avc3"):
+            continue
+        # avcC 位于视觉样本描述的 78 字节固定字段之后
+        avcc = _child(data, stsd[0] + 16 + 78, stsd[0] + 8 + entry_size, b"avcC")[0]
+        config = []
+        pos = avcc + 5
+        for _ in range(2):
+            count = data[pos] & 0x1f
+            pos += 1
+            for _ in range(count):
+                length = struct.unpack(">H", data[pos:pos + 2])[0]
+                config.append(_parameter_set(data[pos + 2:pos + 2 + length]))
+                pos += 2 + length
+
+        stsz = _child(data, *stbl, b"stsz")[0]
+        uniform, count = struct.unpack(">II", data[stsz + 4:stsz + 12])
+        sizes = [uniform] * count if uniform else list(struct.unpack(f">{count}I", data[stsz + 12:stsz + 12 + 4 * count]))
+        stco = _child(data, *stbl, b"stco")
+        if stco:
+            n = struct.unpack(">I", data[stco[0] + 4:stco[0] + 8])[0]
+            chunks = struct.unpack(f">{n}I", data[stco[0] + 8:stco[0] + 8 + 4 * n])
+        else:
+            co64 = _child(data, *stbl, b"co64")[0]
+            n = struct.unpack(">I", data[co64 + 4:co64 + 8])[0]
+            chunks = struct.unpack(f">{n}Q", data[co64 + 8:co64 + 8 + 8 * n])
+        stsc = _child(data, *stbl, b"stsc")[0]
+        n = struct.unpack(">I", data[stsc + 4:stsc + 8])[0]
+        runs = [struct.unpack(">III", data[stsc + 8 + 12 * i:stsc + 20 + 12 * i]) for i in range(n)]
+        stss = _child(data, *stbl, b"stss")
+        if stss:
+            n = struct.unpack(">I", data[stss[0] + 4:stss[0] + 8])[0]
+            sync = set(struct.unpack(f">{n}I", data[stss[0] + 8:stss[0] + 8 + 4 * n]))
+        else:
+            sync = set(range(1, count + 1))
+
+        samples, number = [], 0
+        for i, (first_chunk, per_chunk, _) in enumerate(runs):
+            last_chunk = runs[i + 1][0] if i + 1 < len(runs) else len(chunks) + 1
+            for chunk in range(first_chunk, last_chunk):
+                offset = chunks[chunk - 1]
+                for _ in range(per_chunk):
+                    samples.append((number + 1 in sync, data[offset:offset + sizes[number]]))
+                    offset += sizes[number]
+                    number += 1
+        return entry.decode(), config, samples
+    raise ValueError("没有 H.264 视频轨道")
+
+
+def parameter_set_errors(path):
+    """不经过 ffmpeg 检查 H.264 参数集的存放位置是否符合样本描述类型，返回问题列表"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    entry, config, samples = _video_samples(data)
+    in_config = {(kind, number) for kind, number, _ in config}
+    errors = set()
+    available = set()
+    for sample_number, (key, sample) in enumerate(samples, 1):
+        if key:
+            available = set(in_config)
+            pps_sps = {number: sps for kind, number, sps in config if kind == "pps"}
+        pos = 0
+        while pos + 4 <= len(sample):
+            length = struct.unpack(">I", sample[pos:pos + 4])[0]
+            nal = sample[pos + 4:pos + 4 + length]
+            pos += 4 + length
+            nal_type = nal[0] & 0x1f
+            if nal_type in (7, 8):
+                kind, number, sps = _parameter_set(nal)
+                if entry == "avc1" and (kind, number) not in in_config:
+                    errors.add(f"avc1 样本中出现 avcC 以外的 {kind.upper()} {number}")
+                available.add((kind, number))
+                if kind == "pps":
+                    pps_sps[number] = sps
+            elif nal_type in (1, 5):
+                pps = _exp_golomb(nal[1:], 3)[2]
+                if ("pps", pps) not in available or ("sps", pps_sps.get(pps)) not in available:
+                    errors.add(f"{entry} 第{sample_number}帧引用的 PPS {pps} 在本GOP中不可用")
+    return sorted(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="1920x1080")
+    parser.add_argument("--durations", default="10,30")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split("x"))
+    workdir = tempfile.mkdtemp(prefix="bench-smart-")
+    try:
+        print(f"{'seconds':>8} {'frames':>7} {'full s':>8} {'smart s':>8} {'speedup':>8}  check")
+        for seconds in (int(v) for v in args.durations.split(",")):
+            clip = os.path.join(workdir, f"clip_{seconds}.mp4")
+            make_clip(clip, width, height, seconds)
+            info = probe_video(clip)
+            # 固定删除中间附近的两帧，便于不同时长之间比较
+            frames_to_remove = [info["total_frames"] // 2, info["total_frames"] // 2 + 100]
+
+            start = time.perf_counter()
+            drop_frames(clip, os.path.join(workdir, "full.mp4"), frames_to_remove, info)
+            full_s = time.perf_counter() - start
+
+            smart_output = os.path.join(workdir, "smart.mp4")
+            start = time.perf_counter()
+            result = smart_drop_frames(clip, smart_output, frames_to_remove, info)
+            smart_s = time.perf_counter() - start
+            if result is None:
+                raise SystemExit("智能渲染不适用于该视频")
+
+            count_ok, copied_ok = verify(clip, smart_output, frames_to_remove)
+            stream_errors = parameter_set_errors(smart_output)
+            check = "ok" if count_ok and copied_ok else f"FAIL (帧数 {count_ok}, 复制帧一致 {copied_ok})"
+            if stream_errors:
+                check = f"FAIL ({'; '.join(stream_errors)})"
+            print(f"{seconds:>8} {info['total_frames']:>7} {full_s:>8.1f} {smart_s:>8.1f} "
+                  f"{full_s / smart_s:>7.1f}x  {check}")
+            if check != "ok":
+                sys.exit(1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
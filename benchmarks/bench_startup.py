@@ -0,0 +1,115 @@
+# benchmarks/bench_startup.py - 冷启动首屏渲染基准
+"""
+在新的 Python 进程中用 Streamlit AppTest 渲染 app.py 的首屏（默认标签页、未上传任何文件），
+统计首屏渲染耗时，并用 python -X importtime 的输出按顶层包汇总渲染过程中的导入耗时
+（不含 Streamlit 测试框架本身的导入）。每个 Streamlit 工作进程启动时都要付出这部分开销。
+
+视频处理（video_engine / imageio_ffmpeg）、Unsplash 客户端（requests）等只在用到时才导入，
+首屏不应加载 LAZY_MODULES 中的任何模块；超过 --max-import-ms 或加载了这些模块时以非零状态退出，
+可以放在提交前检查中防止回退。
+
+对比旧版本：git show <提交>:app.py > old_app.py 后用 --app old_app.py 运行（放在仓库根目录下）。
+
+用法：python benchmarks/bench_startup.py [--runs 5] [--top 10] [--max-import-ms 200] [--app app.py]
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 首屏不应加载的模块（按需导入）
+LAZY_MODULES = ["cv2", "moviepy", "numpy", "imageio_ffmpeg", "video_engine", "requests", "unsplash_client"]
+
+APP_MARKER = "--- first render ---"
+
+CHILD = """
+import sys, json, time
+from streamlit.testing.v1 import AppTest
+sys.stderr.write({marker!r} + "\\n")
+sys.stderr.flush()
+start = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=120).run()
+render_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{
+    "render_ms": render_ms,
+    "exceptions": [str(e.value) for e in at.exception],
+    "lazy_loaded": [name for name in {lazy!r} if name in sys.modules],
+}}))
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s*(\d+) \|\s*(\d+) \|( *)(\S+)")
+
+
+def parse_importtime(stderr):
+    """返回标记之后、顶层（直接由首屏渲染触发）导入的 {顶层包: 累计微秒}"""
+    packages = {}
+    seen_marker = False
+    for line in stderr.splitlines():
+        if line.strip() == APP_MARKER:
+            seen_marker = True
+            continue
+        match = IMPORTTIME_LINE.match(line)
+        if not seen_marker or not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        if len(indent) == 1:
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0) + int(cumulative)
+    return packages
+
+
+def measure(app_path):
+    """在新进程中渲染一次首屏，返回 (结果字典, {顶层包: 导入微秒})"""
+    code = CHILD.format(marker=APP_MARKER, app=app_path, lazy=LAZY_MODULES)
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                               capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return result, parse_importtime(completed.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="显示导入耗时最多的包的数量")
+    parser.add_argument("--max-import-ms", type=float, default=200, help="首屏导入耗时上限（中位数）")
+    parser.add_argument("--app", default="app.py", help="要测量的页面脚本（相对仓库根目录）")
+    args = parser.parse_args()
+
+    app_path = os.path.join(ROOT, args.app)
+    renders, imports, packages = [], [], {}
+    for _ in range(args.runs):
+        result, run_packages = measure(app_path)
+        if result["exceptions"]:
+            sys.exit(f"首屏渲染出错: {result['exceptions']}")
+        renders.append(result["render_ms"])
+        imports.append(sum(run_packages.values()) / 1000)
+        for package, us in run_packages.items():
+            packages.setdefault(package, []).append(us / 1000)
+    lazy_loaded = result["lazy_loaded"]
+
+    render_ms = statistics.median(renders)
+    import_ms = statistics.median(imports)
+    print(f"{args.app}：首屏渲染 {render_ms:.0f} ms，其中导入 {import_ms:.0f} ms（{args.runs} 次中位数）")
+    print(f"\n{'package':>20} {'import ms':>10}")
+    ranked = sorted(packages.items(), key=lambda item: -statistics.median(item[1]))
+    for package, values in ranked[:args.top]:
+        print(f"{package:>20} {statistics.median(values):>10.1f}")
+
+    failures = []
+    if lazy_loaded:
+        failures.append(f"首屏加载了应按需导入的模块: {', '.join(lazy_loaded)}")
+    if import_ms > args.max_import_ms:
+        failures.append(f"首屏导入耗时 {import_ms:.0f} ms 超过上限 {args.max_import_ms:.0f} ms")
+    if failures:
+        print("\n" + "\n".join(failures))
+        sys.exit(1)
+    print("\n检查通过：首屏未加载视频处理和 Unsplash 相关模块")
+
+
+if __name__ == "__main__":
+    main()
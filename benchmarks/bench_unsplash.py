@@ -0,0 +1,195 @@
+# benchmarks/bench_unsplash.py - Unsplash 客户端基准与检查
+"""
+在本地模拟服务器（mock_unsplash.py，模拟每个请求的网络延迟和每个新连接的握手开销）上，
+比较原来的裸 requests.get 与 UnsplashClient（连接池 + 搜索缓存 + 磁盘下载缓存）：
+
+浏览流程：搜索第1页 → 下一页 → 下一页 → 上一页 → 上一页，每页选择其中几张图片下载，
+最后重新选择一张看过的图片。统计耗时、服务器收到的请求数和新建连接数。
+
+翻页延迟：每页显示时等待当前页的搜索结果和12张缩略图，用户停留一段时间后点下一页，
+比较有无后台预取（prefetch）时每次翻页到页面可显示的耗时。
+
+选中背景：原来下载 urls.small（400px）后放大到输出尺寸，现在下载按输出尺寸裁剪好的
+raw 图（选择时就在后台开始下载），比较背景准备（解码 + 缩放裁剪）的耗时和源图尺寸。
+
+多选背景：跨页选中 --selected 张后合成，比较逐张下载与并发下载（共用下载线程池）
+到全部背景就绪的耗时。
+
+另外检查：5xx 自动重试、401 报错、搜索缓存过期、磁盘缓存在新客户端实例中仍然命中。
+
+用法：python benchmarks/bench_unsplash.py [--latency 0.02] [--connect-delay 0.05] [--pages 5] [--think 0.5]
+      [--output-size 800] [--selected 20]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from io import BytesIO
+
+import requests
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_unsplash import MockUnsplash  # noqa: E402
+from unsplash_client import UnsplashClient, UnsplashError, UnsplashPhoto, rendition_url, thumbnail_url  # noqa: E402
+from image_cache import DecodeCache  # noqa: E402
+import image_engine  # noqa: E402
+
+PAGES = [1, 2, 3, 2, 1]
+PICKS_PER_PAGE = 3
+
+
+def legacy_browse(base_url):
+    """原实现：每次搜索、每次下载都用 requests.get 新建连接，没有缓存"""
+    for page in PAGES:
+        response = requests.get(f"{base_url}/search/photos", headers={"Authorization": "Client-ID test"},
+                                params={"query": "white background", "page": page, "per_page": 12,
+                                        "orientation": "squarish"}, timeout=10)
+        photos = response.json()["results"]
+        for photo in photos[:PICKS_PER_PAGE]:
+            requests.get(photo["urls"]["small"], timeout=10).content
+    requests.get(photos[0]["urls"]["small"], timeout=10).content
+
+
+def client_browse(client):
+    for page in PAGES:
+        photos, _, _ = client.search("white background", page=page)
+        for photo in photos[:PICKS_PER_PAGE]:
+            client.fetch(photo["urls"]["small"])
+    client.fetch(photos[0]["urls"]["small"])
+
+
+def page_flips(client, pages, think, prefetch):
+    """依次显示各页，返回每次翻页（第一页之后）到缩略图全部就绪的平均毫秒数"""
+    elapsed = []
+    for page in range(1, pages + 1):
+        start = time.perf_counter()
+        photos, total_pages, _ = client.search("page flip", page=page)
+        client.fetch_many([thumbnail_url(photo) for photo in photos])
+        if page > 1:
+            elapsed.append((time.perf_counter() - start) * 1000)
+        if prefetch:
+            client.prefetch("page flip", page, total_pages)
+        time.sleep(think)
+    return sum(elapsed) / len(elapsed)
+
+
+def check(mock, cache_dir):
+    """功能检查，不通过时抛出 AssertionError"""
+    client = UnsplashClient("test", base_url=mock.base_url, cache_dir=cache_dir)
+
+    mock.reset_stats()
+    mock.fail_next(2)
+    photos, total_pages, total = client.search("retry", page=1)
+    assert len(photos) == 12 and total_pages == 20 and total == 240, "搜索结果结构不对"
+    assert mock.requests == 3, f"5xx 应重试两次后成功，实际请求 {mock.requests} 次"
+
+    try:
+        UnsplashClient("", base_url=mock.base_url, cache_dir=cache_dir).search("no key")
+        raise AssertionError("缺少密钥应返回401")
+    except UnsplashError as e:
+        assert e.status_code == 401, f"应为401，实际 {e.status_code}"
+
+    client.search_cache.ttl = 0.05
+    client.search("ttl", page=1)
+    mock.reset_stats()
+    client.search("ttl", page=1)
+    assert mock.requests == 0, "缓存有效期内不应重复请求"
+    time.sleep(0.1)
+    client.search("ttl", page=1)
+    assert mock.requests == 1, "缓存过期后应重新请求"
+
+    client.fetch(photos[0]["urls"]["small"])
+    mock.reset_stats()
+    fresh = UnsplashClient("test", base_url=mock.base_url, cache_dir=cache_dir)
+    fresh.fetch(photos[0]["urls"]["small"])
+    assert mock.requests == 0, "磁盘缓存应在新客户端实例中命中"
+    print("检查通过：重试、401、缓存过期、磁盘缓存")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.02, help="每个请求的延迟（秒）")
+    parser.add_argument("--connect-delay", type=float, default=0.05, help="每个新连接的握手开销（秒）")
+    parser.add_argument("--pages", type=int, default=5, help="翻页测试的页数")
+    parser.add_argument("--think", type=float, default=0.5, help="每页停留的秒数")
+    parser.add_argument("--output-size", type=int, default=800)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--selected", type=int, default=20, help="多选背景的数量")
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix="bench-unsplash-")
+    try:
+        with MockUnsplash(latency=args.latency, connect_delay=args.connect_delay) as mock:
+            check(mock, os.path.join(cache_dir, "check"))
+
+            print(f"{'client':>10} {'seconds':>8} {'requests':>9} {'connections':>12}")
+            mock.reset_stats()
+            start = time.perf_counter()
+            legacy_browse(mock.base_url)
+            legacy_s = time.perf_counter() - start
+            print(f"{'legacy':>10} {legacy_s:>8.2f} {mock.requests:>9} {mock.connections:>12}")
+
+            client = UnsplashClient("test", base_url=mock.base_url, cache_dir=os.path.join(cache_dir, "bench"))
+            mock.reset_stats()
+            start = time.perf_counter()
+            client_browse(client)
+            client_s = time.perf_counter() - start
+            print(f"{'pooled':>10} {client_s:>8.2f} {mock.requests:>9} {mock.connections:>12}")
+            print(f"加速 {legacy_s / client_s:.1f}x")
+
+            print(f"\n翻页到显示（停留 {args.think}s）")
+            print(f"{'mode':>10} {'ms/page':>8}")
+            for prefetch in (False, True):
+                client = UnsplashClient("test", base_url=mock.base_url,
+                                        cache_dir=os.path.join(cache_dir, f"flip-{prefetch}"))
+                flip_ms = page_flips(client, args.pages, args.think, prefetch)
+                print(f"{'prefetch' if prefetch else 'on click':>10} {flip_ms:>8.1f}")
+
+            print(f"\n选中背景后的背景准备（输出 {args.output_size}px）")
+            print(f"{'source':>10} {'source px':>10} {'prepare ms':>11}")
+            client = UnsplashClient("test", base_url=mock.base_url, cache_dir=os.path.join(cache_dir, "select"))
+            photo = client.search("select", page=1)[0][0]
+            sources = {
+                "small": client.fetch(photo["urls"]["small"]),
+                "rendition": UnsplashPhoto(client, photo, "bg.jpg", args.output_size).data(),
+            }
+            for name, data in sources.items():
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    image_engine.decode_cache = DecodeCache(64 * 1024 * 1024)
+                    background = image_engine.prepare_background(
+                        image_engine.load_background(data, args.output_size), args.output_size)
+                prepare_ms = (time.perf_counter() - start) * 1000 / args.repeat
+                size = Image.open(BytesIO(data)).size
+                print(f"{name:>10} {f'{size[0]}x{size[1]}':>10} {prepare_ms:>11.1f}")
+                assert background.image.size == (args.output_size, args.output_size)
+
+            print(f"\n多选 {args.selected} 张背景到全部就绪")
+            print(f"{'mode':>10} {'seconds':>8}")
+            for concurrent in (False, True):
+                client = UnsplashClient("test", base_url=mock.base_url,
+                                        cache_dir=os.path.join(cache_dir, f"multi-{concurrent}"))
+                photos = []
+                page = 1
+                while len(photos) < args.selected:
+                    photos.extend(client.search("multi select", page=page)[0])
+                    page += 1
+                start = time.perf_counter()
+                if concurrent:
+                    selected = [UnsplashPhoto(client, photo, f"{photo['id']}.jpg", args.output_size)
+                                for photo in photos[:args.selected]]
+                    [photo.data() for photo in selected]
+                else:
+                    [client.fetch(rendition_url(photo, args.output_size)) for photo in photos[:args.selected]]
+                print(f"{'parallel' if concurrent else 'serial':>10} {time.perf_counter() - start:>8.2f}")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_upload_memory.py - 视频上传/下载路径内存基准
+"""
+比较视频页原来的上传/下载路径与流式路径的 Python 内存峰值（tracemalloc）：
+
+- 原路径：getvalue() 写入 NamedTemporaryFile → 处理 → f.read() 读回结果存入会话状态；
+- 流式路径：分块计算内容哈希 → 分块复制到内容寻址的缓存文件 → 处理 → 会话状态只保存输出路径。
+
+“处理”用文件复制代替（ffmpeg 在子进程中运行，不计入本进程内存）。上传文件本身
+（Streamlit 的 UploadedFile 缓冲）在开始计量前创建，不计入峰值。
+流式路径再次运行时（页面重新运行）直接复用缓存文件。
+
+用法：python benchmarks/bench_upload_memory.py [--sizes 64,256]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_cache import file_digest  # noqa: E402
+from video_engine import stage_upload  # noqa: E402
+
+
+def legacy_path(upload, workdir):
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4', dir=workdir) as tmp_file:
+        tmp_file.write(upload.getvalue())
+        input_path = tmp_file.name
+    output_path = os.path.join(workdir, "legacy_output.mp4")
+    shutil.copyfile(input_path, output_path)
+    with open(output_path, 'rb') as f:
+        return f.read()
+
+
+def streaming_path(upload, workdir):
+    input_path = stage_upload(upload, "upload.mp4", file_digest(upload), root=workdir)
+    output_path = os.path.join(workdir, "output.mp4")
+    shutil.copyfile(input_path, output_path)
+    return output_path
+
+
+def measure(func, *args):
+    """返回 (内存峰值MB, 耗时秒)；结果在计量结束前保持引用，与会话状态一致"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return peak / 1024 / 1024, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="64,256", help="上传文件大小（MB），逗号分隔")
+    args = parser.parse_args()
+
+    print(f"{'upload MB':>10} {'legacy MB':>10} {'stream MB':>10} {'rerun MB':>9} {'rerun s':>8}")
+    for size_mb in (int(v) for v in args.sizes.split(",")):
+        upload = BytesIO(os.urandom(size_mb * 1024 * 1024))
+        workdir = tempfile.mkdtemp(prefix="bench-upload-")
+        try:
+            legacy_mb, _ = measure(legacy_path, upload, workdir)
+            stream_mb, _ = measure(streaming_path, upload, workdir)
+            rerun_mb, rerun_s = measure(streaming_path, upload, workdir)
+            print(f"{size_mb:>10} {legacy_mb:>10.1f} {stream_mb:>10.1f} {rerun_mb:>9.1f} {rerun_s:>8.2f}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/bench_video_drop.py - 视频抽帧管线基准
+"""
+比较单次编码的 ffmpeg 抽帧（video_engine.drop_frames）与原来的四步管线
+（moviepy 导出音频 → OpenCV 逐帧重写 mp4v → moviepy 重新编码 libx264 + AAC）。
+
+测试视频由 ffmpeg 的 testsrc2 + 正弦音频生成（1080p 与 4K），并校验新管线的
+输出帧数恰好少两帧、音频流被保留。
+
+用法：python benchmarks/bench_video_drop.py [--clips 1920x1080x10,3840x2160x4] [--skip-legacy]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from video_engine import ffmpeg_exe, probe_video, pick_frames_to_remove, drop_frames  # noqa: E402
+
+
+def make_clip(path, width, height, seconds, fps=30):
+    """生成带音频的 H.264 测试视频（关键帧间隔2秒）"""
+    subprocess.run([
+        ffmpeg_exe(), "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={fps}:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+        "-c:v", "libx264", "-preset", "veryfast", "-g", str(fps * 2), "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest", path,
+    ], check=True)
+
+
+def legacy_remove_frames(input_path, output_path, frames_to_remove, workdir):
+    """原来的四步管线（作为对照）"""
+    import cv2
+    from moviepy.editor import VideoFileClip, AudioFileClip
+
+    temp_audio_path = os.path.join(workdir, "temp_audio.wav")
+    temp_video_path = os.path.join(workdir, "temp_video_noaudio.mp4")
+    video_clip = VideoFileClip(input_path)
+    video_clip.audio.write_audiofile(temp_audio_path, verbose=False, logger=None)
+    video_clip.close()
+
+    cap = cv2.VideoCapture(input_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    out = cv2.VideoWriter(temp_video_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    frame_index = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_index not in frames_to_remove:
+            out.write(frame)
+        frame_index += 1
+    cap.release()
+    out.release()
+
+    video_no_audio = VideoFileClip(temp_video_path)
+    final_clip = video_no_audio.set_audio(AudioFileClip(temp_audio_path))
+    final_clip.write_videofile(output_path, codec='libx264', audio_codec='aac', verbose=False, logger=None)
+    video_no_audio.close()
+    final_clip.close()
+
+
+def count_frames(path):
+    """解码计数输出视频的实际帧数"""
+    result = subprocess.run([ffmpeg_exe(), "-i", path, "-map", "0:v:0", "-fps_mode", "passthrough",
+                             "-f", "null", "-"], capture_output=True, text=True)
+    frames = [line for line in result.stderr.replace("\r", "\n").splitlines() if line.startswith("frame=")]
+    return int(frames[-1].split("=", 1)[1].split()[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clips", default="1920x1080x10,3840x2160x4", help="宽x高x秒，逗号分隔")
+    parser.add_argument("--skip-legacy", action="store_true", help="不运行原管线（较慢）")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-video-")
+    try:
+        print(f"{'clip':>16} {'frames':>7} {'legacy s':>9} {'ffmpeg s':>9} {'speedup':>8}  check")
+        for spec in args.clips.split(","):
+            width, height, seconds = (int(v) for v in spec.split("x"))
+            clip = os.path.join(workdir, f"clip_{width}x{height}.mp4")
+            make_clip(clip, width, height, seconds)
+            info = probe_video(clip)
+            frames_to_remove = pick_frames_to_remove(info["total_frames"])
+
+            legacy_s = None
+            if not args.skip_legacy:
+                start = time.perf_counter()
+                legacy_remove_frames(clip, os.path.join(workdir, "legacy.mp4"), frames_to_remove, workdir)
+                legacy_s = time.perf_counter() - start
+
+            output = os.path.join(workdir, "output.mp4")
+            start = time.perf_counter()
+            frames, audio_mode = drop_frames(clip, output, frames_to_remove, info)
+            new_s = time.perf_counter() - start
+
+            output_info = probe_video(output)
+            ok = count_frames(output) == info["total_frames"] - 2 and output_info["audio_codec"] == "aac"
+            check = f"{'ok' if ok else 'FAIL'} (音频 {audio_mode})"
+            legacy_text = f"{legacy_s:>9.1f}" if legacy_s else f"{'-':>9}"
+            speedup = f"{legacy_s / new_s:>7.1f}x" if legacy_s else f"{'-':>8}"
+            print(f"{spec:>16} {info['total_frames']:>7} {legacy_text} {new_s:>9.1f} {speedup}  {check}")
+            if not ok:
+                sys.exit(1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_watermark.py - Logo水印引擎基准
+"""
+比较区域合成的 add_logo 与原来的整图实现（整图复制 + 逐像素调整透明度 +
+整幅透明图层合成）：先校验多种位置/大小/透明度下结果逐字节一致，再在大图上测量耗时。
+
+用法：python benchmarks/bench_watermark.py [--repeat 5] [--sizes 2000x1500,6000x4000]
+"""
+import os
+import sys
+import time
+import argparse
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from watermark_engine import add_logo  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOGO_PATHS = [os.path.join(ROOT, "logos", name) for name in ("b_logo.png", "w_logo.png")]
+
+
+def legacy_add_logo(base_image, logo_image, x_percent, y_percent, size_percent, opacity):
+    """原实现（作为对照）"""
+    base_img = base_image.copy().convert('RGBA')
+    logo_img = logo_image.copy().convert('RGBA')
+    base_width, base_height = base_img.size
+    logo_size = int(min(base_width, base_height) * (size_percent / 100))
+    logo_img.thumbnail((logo_size, logo_size), Image.Resampling.LANCZOS)
+    if opacity < 255:
+        alpha = logo_img.split()[3]
+        alpha = alpha.point(lambda p: p * opacity // 255)
+        logo_img.putalpha(alpha)
+    logo_width, logo_height = logo_img.size
+    x_pos = int((base_width - logo_width) * (x_percent / 100))
+    y_pos = int((base_height - logo_height) * (y_percent / 100))
+    logo_layer = Image.new('RGBA', base_img.size, (0, 0, 0, 0))
+    logo_layer.paste(logo_img, (x_pos, y_pos), logo_img)
+    return Image.alpha_composite(base_img, logo_layer)
+
+
+def make_photo(width, height, mode='RGB'):
+    """带渐变的测试照片（PNG测试图带半透明区域）"""
+    photo = Image.merge('RGB', (
+        Image.linear_gradient('L').resize((width, height)),
+        Image.radial_gradient('L').resize((width, height)),
+        Image.linear_gradient('L').rotate(90).resize((width, height)),
+    ))
+    if mode == 'RGBA':
+        photo = photo.convert('RGBA')
+        photo.putalpha(Image.radial_gradient('L').resize((width, height)))
+    return photo
+
+
+def check(logo):
+    """逐字节比较新旧实现，返回检查的组合数"""
+    cases = 0
+    for base in (make_photo(640, 480), make_photo(300, 500, 'RGBA')):
+        for x, y in ((0, 0), (50, 50), (100, 100), (5, 95)):
+            for size in (5, 30, 100, 200):
+                for opacity in (0, 128, 180, 255):
+                    expected = legacy_add_logo(base, logo, x, y, size, opacity)
+                    actual = add_logo(base, logo, x, y, size, opacity)
+                    if actual.tobytes() != expected.tobytes():
+                        raise SystemExit(f"结果不一致: size={base.size} x={x} y={y} logo={size}% opacity={opacity}")
+                    cases += 1
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", default="2000x1500,6000x4000")
+    args = parser.parse_args()
+
+    logos = [Image.open(path) for path in LOGO_PATHS if os.path.exists(path)]
+    if not logos:
+        raise SystemExit("未找到 logos/b_logo.png 或 logos/w_logo.png")
+    cases = sum(check(logo) for logo in logos)
+    print(f"校验 {cases} 种组合：结果逐字节一致")
+
+    logo = logos[0]
+    print(f"{'size':>10} {'legacy ms':>10} {'region ms':>10} {'speedup':>8}")
+    for spec in args.sizes.split(","):
+        width, height = (int(v) for v in spec.split("x"))
+        photo = make_photo(width, height)
+        add_logo(photo, logo, 95, 95, 15, 180)  # 预热：缓存缩放后的Logo
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            legacy_add_logo(photo, logo, 95, 95, 15, 180)
+        legacy_ms = (time.perf_counter() - start) * 1000 / args.repeat
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            add_logo(photo, logo, 95, 95, 15, 180)
+        region_ms = (time.perf_counter() - start) * 1000 / args.repeat
+        print(f"{spec:>10} {legacy_ms:>10.1f} {region_ms:>10.1f} {legacy_ms / region_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# benchmarks/check_compose_pool.py - 合成进程池检查
+"""
+模拟 Streamlit 服务进程中的多线程环境运行批量合成，检查：
+
+- 其他线程持有模块级缓存的锁（decode_cache / overlay_cache）时启动进程池，
+  子进程不会因继承到已加锁的锁而卡住（超时即判定失败）；
+- 进程池的输出与当前进程串行合成的结果逐字节一致；
+- 两个会话同时提交输入完全相同的任务（共用同一个任务目录），以及同一会话取消后立即
+  重新提交时，任务都不会失败，最终清单和压缩包包含全部输出；
+- 队列中的一个任务从头到尾只创建一个进程池，启动的工作进程数不超过分到的并行数
+  （每个工作进程只准备一次背景、解码一次产品图），工作进程的解码缓存预算按并行数分摊；
+- 任务结束后句柄不再引用输入图片（ComposeJob 被回收），过期的句柄在任务结束时清除。
+
+用法：python benchmarks/check_compose_pool.py [--workers 2] [--timeout 120] [--trials 5]
+"""
+import os
+import sys
+import time
+import shutil
+import zipfile
+import gc
+import argparse
+import tempfile
+import threading
+import weakref
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_compose import make_background, make_product  # noqa: E402
+import image_engine  # noqa: E402
+from image_cache import decode_cache, overlay_cache  # noqa: E402
+from image_engine import ComposeJob, iter_compose_results, THREAD_FALLBACK_THRESHOLD  # noqa: E402
+from job_store import SynthesisJob  # noqa: E402
+import job_queue  # noqa: E402
+from job_queue import JobQueue  # noqa: E402
+
+SETTINGS = {
+    "product_size": 300,
+    "output_size": 400,
+    "output_format": "JPG",
+    "mask_enabled": True,
+    "mask_color": (255, 255, 255),
+    "mask_opacity": 20,
+}
+
+
+def make_job(backgrounds=2, products=THREAD_FALLBACK_THRESHOLD // 2):
+    return ComposeJob([make_background(i, (1200, 800)) for i in range(backgrounds)],
+                      [make_product(j, (600, 800)) for j in range(products)], None, SETTINGS)
+
+
+def check_locks_held(workers, timeout):
+    """其他线程持有缓存锁期间运行进程池"""
+    job = make_job()
+    reference = {(r.bg_index, r.product_index): r.data for r in iter_compose_results(job, max_workers=1)}
+
+    results = {}
+    release = threading.Event()
+    locked = threading.Event()
+
+    def hold_locks():
+        with decode_cache._cache._lock, overlay_cache._cache._lock:
+            locked.set()
+            release.wait()
+
+    def run_pool():
+        for result in iter_compose_results(make_job(), max_workers=workers):
+            results[(result.bg_index, result.product_index)] = result.data
+
+    holder = threading.Thread(target=hold_locks, daemon=True)
+    holder.start()
+    locked.wait()
+    runner = threading.Thread(target=run_pool, daemon=True)
+    runner.start()
+    runner.join(timeout)
+    release.set()
+    assert not runner.is_alive(), f"{timeout}s 内未完成：子进程可能卡在继承的锁上"
+    assert results == reference, "进程池输出与串行结果不一致"
+
+
+def wait_finished(handles, timeout):
+    deadline = time.time() + timeout
+    while any(handle.active for handle in handles):
+        assert time.time() < deadline, f"{timeout}s 内任务未结束"
+        time.sleep(0.05)
+
+
+def check_identical_jobs(trials, timeout):
+    """相同输入的任务同时运行 / 取消后立即重新提交"""
+    for trial in range(trials):
+        root = tempfile.mkdtemp(prefix="check-jobs-")
+        try:
+            queue = JobQueue(max_running=4, total_workers=2)
+            job = make_job(2, 10)
+            arcnames = {task: f"{task[0]}_{task[1]}.jpg" for task in job.tasks()}
+            new_job = lambda: SynthesisJob(make_job(2, 10), arcnames, root=root)
+
+            # 同一任务目录的多个实例同时保存清单
+            errors = []
+            def save_repeatedly(synthesis_job):
+                try:
+                    for _ in range(200):
+                        synthesis_job.save()
+                except OSError as e:
+                    errors.append(e)
+            savers = [threading.Thread(target=save_repeatedly, args=(new_job(),)) for _ in range(8)]
+            for saver in savers:
+                saver.start()
+            for saver in savers:
+                saver.join()
+            assert not errors, f"第{trial + 1}次：并发保存清单出错: {errors[0]!r}"
+
+            first = queue.submit("session-a", new_job())
+            second = queue.submit("session-b", new_job())
+            resubmitted = queue.submit("session-a", new_job())  # 取消 first 后重新提交
+            handles = [first, second, resubmitted]
+            wait_finished(handles, timeout)
+
+            assert first.status in ("done", "cancelled"), f"第{trial + 1}次：任务 {first.status}: {first.error!r}"
+            for handle in (second, resubmitted):
+                assert handle.status == "done", f"第{trial + 1}次：任务 {handle.status}: {handle.error!r}"
+                with zipfile.ZipFile(handle.archive) as archive:
+                    assert len(archive.namelist()) == job.total, "压缩包缺少输出"
+            reloaded = new_job()
+            assert not reloaded.pending_tasks(), "最终清单缺少输出"
+            leftovers = [name for name in os.listdir(reloaded.dir) if name.startswith(".tmp-")]
+            assert not leftovers, f"遗留临时文件: {leftovers}"
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def check_single_pool(timeout, workers=4):
+    """队列任务只创建一个进程池，工作进程数不超过并行数"""
+    pools = []
+
+    class CountingPool(image_engine.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.cache_budget = kwargs["initargs"][1]
+            pools.append(self)
+
+        def shutdown(self, *args, **kwargs):
+            self.process_count = len(self._processes or {})
+            super().shutdown(*args, **kwargs)
+
+    original = image_engine.ProcessPoolExecutor
+    image_engine.ProcessPoolExecutor = CountingPool
+    root = tempfile.mkdtemp(prefix="check-jobs-")
+    try:
+        job = make_job(3, 20)
+        arcnames = {task: f"{task[0]}_{task[1]}.jpg" for task in job.tasks()}
+        handle = JobQueue(total_workers=workers).submit("session", SynthesisJob(job, arcnames, root=root))
+        wait_finished([handle], timeout)
+        assert handle.status == "done", f"任务 {handle.status}: {handle.error!r}"
+        assert len(pools) == 1, f"一个任务创建了 {len(pools)} 个进程池"
+        assert pools[0].process_count <= workers, f"启动了 {pools[0].process_count} 个工作进程"
+        assert pools[0].cache_budget <= decode_cache.max_bytes // workers, "工作进程的解码缓存预算未按并行数分摊"
+        return pools[0].process_count
+    finally:
+        image_engine.ProcessPoolExecutor = original
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def check_released_inputs(timeout):
+    """任务结束后释放输入；结束时清除已过期的句柄"""
+    root = tempfile.mkdtemp(prefix="check-jobs-")
+    try:
+        queue = JobQueue(total_workers=2)
+        job = make_job(2, 10)
+        arcnames = {task: f"{task[0]}_{task[1]}.jpg" for task in job.tasks()}
+        compose_ref = weakref.ref(job)
+        first = queue.submit("session-a", SynthesisJob(job, arcnames, root=root))
+        del job
+        wait_finished([first], timeout)
+        gc.collect()
+        assert first.status == "done", f"任务 {first.status}: {first.error!r}"
+        assert first.synthesis_job is None and compose_ref() is None, "任务结束后仍引用输入图片"
+        assert first.settings == SETTINGS and first.archive is not None, "句柄缺少收取结果所需的数据"
+
+        # 另一个会话的任务结束时清除已过期的句柄（不必等到下一次提交）
+        job = make_job(2, 20)
+        arcnames = {task: f"{task[0]}_{task[1]}.jpg" for task in job.tasks()}
+        second = queue.submit("session-b", SynthesisJob(job, arcnames, root=root))
+        del job
+        first.finished_at -= job_queue.FINISHED_JOB_TTL + 1
+        assert queue.get("session-a") is first and second.active, "提交时不应清除未过期的句柄"
+        wait_finished([second], timeout)
+        assert queue.get("session-a") is None, "已过期的句柄未在任务结束时清除"
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--trials", type=int, default=5)
+    args = parser.parse_args()
+
+    check_locks_held(args.workers, args.timeout)
+    print("检查通过：缓存锁被占用时进程池正常完成，输出与串行一致")
+    check_identical_jobs(args.trials, args.timeout)
+    print(f"检查通过：相同任务并发提交、取消后重新提交（{args.trials} 次）均正常完成")
+    processes = check_single_pool(args.timeout)
+    print(f"检查通过：3 背景 × 20 产品的队列任务只创建 1 个进程池、{processes} 个工作进程")
+    check_released_inputs(args.timeout)
+    print("检查通过：任务结束后释放输入图片，过期句柄在任务结束时清除")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# benchmarks/check_video_concurrency.py - 并发视频任务隔离检查
+"""
+模拟多个会话同时处理视频：N 个线程各自在独立的任务临时目录中，对同名输入文件
+（input.mp4 → output.mp4）运行与页面相同的抽帧流程，检查：
+
+- 每个输出的帧数恰好少两帧；智能渲染的输出中未重新编码的帧与原视频解码结果逐位相同，
+  H.264 参数集的存放位置符合样本描述类型；
+- 删除的帧不同的任务，输出内容也不同（没有互相覆盖）；
+- 全部任务结束后临时目录根路径下没有遗留文件，包括中途失败的任务；
+- ffmpeg 输出大量错误/日志信息（超过管道缓冲区）时不会卡住。
+
+VIDEO_SCRATCH_DIR 指向本脚本创建的临时目录，不影响正在运行的服务。
+
+用法：python benchmarks/check_video_concurrency.py [--jobs 6] [--size 640x360] [--seconds 8]
+"""
+import os
+import sys
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+SCRATCH = tempfile.mkdtemp(prefix="check-video-scratch-")
+os.environ["VIDEO_SCRATCH_DIR"] = SCRATCH
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_video_drop import make_clip  # noqa: E402
+from bench_smart_render import verify, parameter_set_errors  # noqa: E402
+from video_engine import job_workspace, run_video_task, _run_ffmpeg  # noqa: E402
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def run_job(index, source):
+    """与页面单个视频处理相同：复制上传文件 → 抽帧 → 取出结果，全部在独立临时目录中"""
+    with job_workspace("check") as workdir:
+        input_path = os.path.join(workdir, "input.mp4")
+        output_path = os.path.join(workdir, "output.mp4")
+        shutil.copyfile(source, input_path)
+        result = run_video_task(index, "input.mp4", input_path, output_path, smart=index % 2 == 0)
+        if result.error:
+            return index, None, result.error, None
+        count_ok, copied_ok = verify(source, output_path, result.frames_removed)
+        if result.video_info["render_mode"] != "smart":
+            # 整段重新编码时没有直接复制的帧
+            copied_ok = None
+        elif parameter_set_errors(output_path):
+            copied_ok = False
+        return index, result.frames_removed, (count_ok, copied_ok), file_hash(output_path)
+
+
+def failing_job():
+    """中途出错的任务也必须删除临时目录"""
+    with job_workspace("check") as workdir:
+        with open(os.path.join(workdir, "partial.mp4"), 'wb') as f:
+            f.write(b"\0" * 1024)
+        raise RuntimeError("模拟失败")
+
+
+def check_stderr_flood(timeout=60):
+    """ffmpeg 每帧向 stderr 输出一行（远超管道缓冲区），必须在超时前正常结束"""
+    result = {}
+
+    def run():
+        result["frames"] = _run_ffmpeg(["-loglevel", "info", "-f", "lavfi",
+                                        "-i", "testsrc=duration=60:size=320x240:rate=25",
+                                        "-vf", "showinfo", "-f", "null", "-"])
+
+    runner = threading.Thread(target=run, daemon=True)
+    runner.start()
+    runner.join(timeout)
+    return not runner.is_alive() and result.get("frames") == 1500
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=6)
+    parser.add_argument("--size", default="640x360")
+    parser.add_argument("--seconds", type=int, default=8)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split("x"))
+    workdir = tempfile.mkdtemp(prefix="check-video-")
+    failed = False
+    try:
+        source = os.path.join(workdir, "source.mp4")
+        make_clip(source, width, height, args.seconds)
+
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [executor.submit(run_job, index, source) for index in range(args.jobs)]
+            failure = executor.submit(failing_job)
+            results = [future.result() for future in futures]
+        try:
+            failure.result()
+        except RuntimeError:
+            pass
+
+        print(f"{'job':>4} {'removed':>10} {'frames':>7} {'copied':>7}  sha1")
+        outputs = {}
+        for index, frames, check, digest in results:
+            if frames is None:
+                print(f"{index:>4} FAIL: {check}")
+                failed = True
+                continue
+            count_ok, copied_ok = check
+            failed |= not count_ok or copied_ok is False
+            copied = '-' if copied_ok is None else 'ok' if copied_ok else 'FAIL'
+            print(f"{index:>4} {str(frames):>10} {'ok' if count_ok else 'FAIL':>7} {copied:>7}  {digest[:12]}")
+            outputs.setdefault(tuple(frames), set()).add(digest)
+
+        # 删除的帧不同的任务，输出必须不同
+        digests = [digest for group in outputs.values() for digest in group]
+        distinct = len(set(digests)) == len(digests)
+        leftovers = os.listdir(SCRATCH)
+        print(f"不同删帧组合 {len(outputs)} 个，输出{'互不相同' if distinct else '存在重复（被覆盖）'}")
+        print(f"临时目录遗留: {leftovers or '无'}")
+        failed |= not distinct or bool(leftovers)
+
+        stderr_ok = check_stderr_flood()
+        print(f"大量错误输出时 ffmpeg {'正常结束' if stderr_ok else '卡住（stderr 未及时读取）'}")
+        failed |= not stderr_ok
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        shutil.rmtree(SCRATCH, ignore_errors=True)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
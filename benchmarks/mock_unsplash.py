@@ -0,0 +1,205 @@
+# benchmarks/mock_unsplash.py - 本地模拟 Unsplash 服务器
+"""
+离线测试和基准用的 Unsplash API 替身：
+
+- GET /search/photos?query=&page=&per_page=&orientation=  返回与真实接口相同结构的JSON
+  （需要 Authorization: Client-ID ... 请求头，否则返回401）；
+- GET /photos/<id>?w=&h=&fit=crop  返回按参数尺寸生成的JPEG（不带参数时为原图尺寸），
+  结果中的 urls.raw / urls.small 都指向这里。
+
+可以模拟网络延迟（每个请求）和建立连接的开销（每个新连接，相当于TCP+TLS握手），
+并统计请求数和连接数；fail_next() 让接下来的若干请求返回错误，用于检查重试。
+
+作为脚本运行时在前台提供服务，配合页面离线调试：
+    python benchmarks/mock_unsplash.py --port 8765
+    UNSPLASH_API_URL=http://127.0.0.1:8765 UNSPLASH_ACCESS_KEY=test streamlit run app.py
+"""
+import io
+import json
+import time
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from PIL import Image, ImageDraw
+
+# 原图尺寸（urls.raw 不带参数时）
+RAW_SIZE = (3000, 2000)
+SMALL_WIDTH = 400
+
+
+class MockUnsplash:
+    """在后台线程运行的模拟服务器（可用作 with 语句）"""
+    def __init__(self, port=0, latency=0.0, connect_delay=0.0, total=240):
+        self.latency = latency
+        self.connect_delay = connect_delay
+        self.total = total
+        self.requests = 0
+        self.connections = 0
+        self.paths = []
+        self._failures = []
+        self._images = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def fail_next(self, count, status=503):
+        """接下来的 count 个请求返回 status"""
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = 0
+            self.connections = 0
+            self.paths = []
+
+    # ---------- 响应内容 ----------
+    def search_response(self, query, page, per_page):
+        total_pages = (self.total + per_page - 1) // per_page
+        start = (page - 1) * per_page
+        results = []
+        for i in range(start, min(start + per_page, self.total)):
+            photo_id = f"{hashlib.sha1(query.encode()).hexdigest()[:8]}-{i}"
+            raw = f"{self.base_url}/photos/{photo_id}"
+            results.append({
+                "id": photo_id,
+                "width": RAW_SIZE[0],
+                "height": RAW_SIZE[1],
+                "urls": {
+                    "raw": raw,
+                    "full": raw,
+                    "regular": f"{raw}?w=1080",
+                    "small": f"{raw}?w={SMALL_WIDTH}",
+                    "thumb": f"{raw}?w=200",
+                },
+                "user": {"name": "Mock Photographer"},
+            })
+        return {"total": self.total, "total_pages": total_pages, "results": results}
+
+    def image_bytes(self, photo_id, width, height):
+        key = (photo_id, width, height)
+        with self._lock:
+            data = self._images.get(key)
+        if data is None:
+            color = tuple(hashlib.sha1(photo_id.encode()).digest()[:3])
+            img = Image.new('RGB', (width, height), color)
+            draw = ImageDraw.Draw(img)
+            for k in range(0, width, max(width // 16, 1)):
+                draw.line((k, 0, width - k, height), fill=(255 - color[0], 128, color[2]), width=3)
+            buffer = io.BytesIO()
+            img.save(buffer, format='JPEG', quality=85)
+            data = buffer.getvalue()
+            with self._lock:
+                self._images[key] = data
+        return data
+
+    @staticmethod
+    def rendition_size(params):
+        """按 w / h / fit=crop 计算输出尺寸（与 Unsplash 动态缩放一致：只给一边时按比例）"""
+        width = int(params.get("w", [0])[0] or 0)
+        height = int(params.get("h", [0])[0] or 0)
+        raw_w, raw_h = RAW_SIZE
+        if width and height and params.get("fit", [""])[0] == "crop":
+            return width, height
+        if width and height:
+            scale = min(width / raw_w, height / raw_h)
+        elif width:
+            scale = width / raw_w
+        elif height:
+            scale = height / raw_h
+        else:
+            return RAW_SIZE
+        return max(1, round(raw_w * scale)), max(1, round(raw_h * scale))
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with mock._lock:
+                    mock.connections += 1
+                if mock.connect_delay:
+                    time.sleep(mock.connect_delay)
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with mock._lock:
+                    mock.requests += 1
+                    mock.paths.append(self.path)
+                    failure = mock._failures.pop(0) if mock._failures else None
+                if mock.latency:
+                    time.sleep(mock.latency)
+                if failure:
+                    self._send(failure, b'{"errors": ["mock failure"]}', "application/json")
+                    return
+                url = urlparse(self.path)
+                params = parse_qs(url.query)
+                if url.path == "/search/photos":
+                    authorization = self.headers.get("Authorization", "")
+                    if not authorization.startswith("Client-ID ") or not authorization[len("Client-ID "):].strip():
+                        self._send(401, b'{"errors": ["OAuth error"]}', "application/json")
+                        return
+                    body = mock.search_response(params.get("query", [""])[0],
+                                                int(params.get("page", [1])[0]),
+                                                int(params.get("per_page", [10])[0]))
+                    self._send(200, json.dumps(body).encode(), "application/json")
+                elif url.path.startswith("/photos/"):
+                    width, height = mock.rendition_size(params)
+                    self._send(200, mock.image_bytes(url.path.rsplit("/", 1)[1], width, height), "image/jpeg")
+                else:
+                    self._send(404, b'{"errors": ["not found"]}', "application/json")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟（秒）")
+    parser.add_argument("--connect-delay", type=float, default=0.0, help="每个新连接的延迟（秒）")
+    args = parser.parse_args()
+
+    mock = MockUnsplash(args.port, args.latency, args.connect_delay)
+    print(f"模拟 Unsplash 服务器: {mock.base_url}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+# image_cache.py - 图片缓存
+"""
+进程内共享的图片缓存（按内容哈希索引，LRU淘汰，限制总字节数）。
+
+模块级实例在 Streamlit 多次重新运行之间保持不变；合成进程池的子进程
+（forkserver / spawn 启动）各有一份独立的缓存，预算按并行数分摊（见 image_engine._init_worker）。
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from PIL import Image
+
+
+def content_hash(data):
+    """计算文件内容哈希，作为缓存键"""
+    return hashlib.sha1(data).hexdigest()
+
+
+def file_digest(fileobj, chunk_size=1024 * 1024):
+    """分块读取文件对象计算内容哈希（与 content_hash(全部内容) 相同），不复制整个文件"""
+    position = fileobj.tell()
+    fileobj.seek(0)
+    digest = hashlib.sha1()
+    for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+        digest.update(chunk)
+    fileobj.seek(position)
+    return digest.hexdigest()
+
+
+def image_digest(image):
+    """已解码图片（如Unsplash下载的背景）的像素内容哈希"""
+    digest = hashlib.sha1(f"{image.mode}:{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def source_digest(source):
+    """图片来源（编码字节或PIL图片）的内容哈希"""
+    return content_hash(source) if isinstance(source, bytes) else image_digest(source)
+
+
+def image_nbytes(image):
+    """估算解码后图片占用的内存字节数"""
+    return image.width * image.height * len(image.getbands())
+
+
+def image_size(data):
+    """只读取文件头得到图片尺寸（不解码像素）"""
+    with Image.open(BytesIO(data)) as image:
+        return image.size
+
+
+def _budget_from_env(name, default_mb):
+    try:
+        return int(float(os.environ.get(name, default_mb)) * 1024 * 1024)
+    except ValueError:
+        return default_mb * 1024 * 1024
+
+
+# 降低分辨率解码时保留的倍数：解码结果至少为目标尺寸的这么多倍，再用LANCZOS缩小
+# （与 Image.thumbnail 的 reducing_gap 默认值一致，画质与完整解码无明显差别）
+DRAFT_REDUCING_GAP = 2.0
+
+
+class LRUByteCache:
+    """按字节预算淘汰的LRU缓存（线程安全）"""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            # 单个条目超过总预算时不缓存
+            if nbytes > self.max_bytes:
+                return value
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+            return value
+
+    def set_budget(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+
+    def peek(self, key):
+        """查看条目（不计入命中统计，不调整LRU顺序）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DecodeCache:
+    """解码缓存：按 (内容哈希, 模式) 缓存解码后的图片，以及按尺寸缩放后的缩略图
+
+    进程内所有会话共享：同一文件不论在哪个会话、哪个页面位置用到，每个模式只解码一次，
+    每个尺寸只缩放一次。返回的图片是共享对象，调用方不要原地修改。
+    """
+    def __init__(self, max_bytes):
+        self._cache = LRUByteCache(max_bytes)
+        self._session_stats = {}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def max_bytes(self):
+        return self._cache.max_bytes
+
+    def set_budget(self, max_bytes):
+        """调整字节预算，超出的条目立即淘汰"""
+        self._cache.set_budget(max_bytes)
+
+    @property
+    def stats(self):
+        return {"hits": self._cache.hits, "misses": self._cache.misses,
+                "entries": len(self._cache), "bytes": self._cache.current_bytes}
+
+    def session_stats(self, session_id):
+        """某个会话的命中/未命中次数"""
+        with self._stats_lock:
+            hits, misses = self._session_stats.get(session_id, (0, 0))
+        return {"hits": hits, "misses": misses}
+
+    def _count(self, session_id, hit):
+        if session_id is None:
+            return
+        with self._stats_lock:
+            hits, misses = self._session_stats.get(session_id, (0, 0))
+            self._session_stats[session_id] = (hits + 1, misses) if hit else (hits, misses + 1)
+
+    def decode(self, data, mode=None, digest=None, session_id=None, cache=True):
+        """解码后的图片；mode 为 None 时保持原始模式
+
+        cache: 为 False 时只复用已缓存的结果，新解码的图片不放入缓存（只用作中间结果时）。
+        """
+        key = (digest or content_hash(data), mode)
+        image = self._cache.get(key)
+        self._count(session_id, image is not None)
+        if image is None:
+            image = Image.open(BytesIO(data))
+            image.load()
+            if mode is not None and image.mode != mode:
+                image = image.convert(mode)
+            if cache:
+                self._cache.put(key, image, image_nbytes(image))
+        return image
+
+    def decode_reduced(self, data, min_size, mode=None, digest=None, session_id=None):
+        """按需降低分辨率解码：结果不小于 min_size（宽, 高）
+
+        JPEG 通过 draft() 在解码时直接做 DCT 缩放（1/2、1/4、1/8），解码时间和内存
+        随之成倍下降；其他格式、或无法缩小时返回完整解码结果。已缓存完整解码结果时直接复用。
+        """
+        digest = digest or content_hash(data)
+        full = self._cache.peek((digest, mode))
+        if full is not None:
+            return self.decode(data, mode, digest, session_id)
+        image = Image.open(BytesIO(data))
+        full_size = image.size
+        image.draft(None, (max(int(min_size[0]), 1), max(int(min_size[1]), 1)))
+        if image.size == full_size:
+            return self.decode(data, mode, digest, session_id)
+        key = (digest, mode, "draft", image.size)
+        cached = self._cache.get(key)
+        self._count(session_id, cached is not None)
+        if cached is not None:
+            return cached
+        image.load()
+        if mode is not None and image.mode != mode:
+            image = image.convert(mode)
+        self._cache.put(key, image, image_nbytes(image))
+        return image
+
+    def thumbnail(self, data, box, mode=None, digest=None, session_id=None, draft=True):
+        """缩放到 box（宽, 高）以内的缩略图（LANCZOS，保持比例）
+
+        draft: 允许降低分辨率解码（目标尺寸的 DRAFT_REDUCING_GAP 倍以上），只用于预览。
+        """
+        digest = digest or content_hash(data)
+        key = (digest, mode, tuple(box))
+        image = self._cache.get(key)
+        self._count(session_id, image is not None)
+        if image is None:
+            if draft:
+                width, height = image_size(data)
+                ratio = min(box[0] / width, box[1] / height, 1.0)
+                min_size = (width * ratio * DRAFT_REDUCING_GAP, height * ratio * DRAFT_REDUCING_GAP)
+                image = self.decode_reduced(data, min_size, mode, digest, session_id).copy()
+            elif self._cache.peek((digest, mode)) is not None:
+                image = self.decode(data, mode, digest, session_id).copy()
+            else:
+                # 完整解码只是缩放的中间结果，不放入缓存（产品图原图的RGBA可达数十MB）
+                image = self.decode(data, mode, digest, session_id, cache=False)
+            image.thumbnail(box, Image.Resampling.LANCZOS)
+            self._cache.put(key, image, image_nbytes(image))
+        return image
+
+    def fitted(self, data, size, digest=None, session_id=None):
+        """缩放到 size × size 以内的RGBA图片（产品图，参与最终输出，始终完整解码）"""
+        return self.thumbnail(data, (size, size), 'RGBA', digest, session_id, draft=False)
+
+
+# 上传文件 file_id → 内容哈希（同一上传文件每次重新运行不必重新计算哈希）
+_upload_digests = OrderedDict()
+_upload_digests_lock = threading.Lock()
+UPLOAD_DIGEST_ENTRIES = 4096
+
+
+def upload_digest(uploaded_file):
+    """上传文件的内容哈希（按 file_id 记忆）"""
+    file_id = getattr(uploaded_file, 'file_id', None)
+    if file_id is None:
+        return file_digest(uploaded_file)
+    with _upload_digests_lock:
+        digest = _upload_digests.get(file_id)
+        if digest is not None:
+            _upload_digests.move_to_end(file_id)
+            return digest
+    digest = file_digest(uploaded_file)
+    with _upload_digests_lock:
+        _upload_digests[file_id] = digest
+        while len(_upload_digests) > UPLOAD_DIGEST_ENTRIES:
+            _upload_digests.popitem(last=False)
+    return digest
+
+
+class OverlayCache:
+    """叠加图层缓存：铺满画布的Logo图层和颜色遮罩层
+
+    只取决于侧边栏设置，同一设置下整批任务、以及之后的任务都复用同一份图层。
+    返回的图层是共享对象，调用方不要原地修改。
+    """
+    def __init__(self, max_bytes):
+        self._cache = LRUByteCache(max_bytes)
+
+    def logo_layer(self, logo_path, output_size):
+        """缩放到 output_size × output_size 的RGBA Logo图层（按文件修改时间失效）"""
+        stat = os.stat(logo_path)
+        key = ("logo", os.path.abspath(logo_path), stat.st_mtime_ns, stat.st_size, output_size)
+        layer = self._cache.get(key)
+        if layer is None:
+            layer = Image.open(logo_path).convert('RGBA')
+            if layer.size != (output_size, output_size):
+                layer = layer.resize((output_size, output_size), Image.Resampling.LANCZOS)
+            self._cache.put(key, layer, image_nbytes(layer))
+        return layer
+
+    def mask_layer(self, output_size, mask_color, mask_opacity):
+        """颜色遮罩层（mask_opacity 为0-100）"""
+        key = ("mask", output_size, tuple(mask_color), mask_opacity)
+        layer = self._cache.get(key)
+        if layer is None:
+            mask_opacity_int = int(mask_opacity * 255 / 100)  # 转换为0-255范围
+            r, g, b = mask_color
+            layer = Image.new('RGBA', (output_size, output_size), (r, g, b, mask_opacity_int))
+            self._cache.put(key, layer, image_nbytes(layer))
+        return layer
+
+
+def _logo_key(logo_image):
+    """Logo图片的缓存键：从文件打开的按路径和修改时间，否则按像素内容"""
+    path = getattr(logo_image, 'filename', None)
+    if path and os.path.exists(path):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    return image_digest(logo_image)
+
+
+class WatermarkLogoCache:
+    """水印Logo缓存：按 (Logo, 边长, 透明度) 预先缩放、调好透明度的Logo块
+
+    返回的是Logo以自身透明度为蒙版贴到透明底上的结果（与贴到整幅透明图层上的
+    对应区域逐像素相同），加水印时只需与底图上Logo所在的区域合成。
+    """
+    def __init__(self, max_bytes):
+        self._cache = LRUByteCache(max_bytes)
+
+    def get(self, logo_image, logo_size, opacity):
+        key = (_logo_key(logo_image), logo_size, opacity)
+        tile = self._cache.get(key)
+        if tile is None:
+            logo_img = logo_image.convert('RGBA')
+            logo_img.thumbnail((logo_size, logo_size), Image.Resampling.LANCZOS)
+            # 调整Logo透明度（查找表，等价于逐像素 p * opacity // 255）
+            if opacity < 255:
+                alpha = logo_img.getchannel('A').point([p * opacity // 255 for p in range(256)])
+                logo_img.putalpha(alpha)
+            tile = Image.new('RGBA', logo_img.size, (0, 0, 0, 0))
+            tile.paste(logo_img, (0, 0), logo_img)
+            self._cache.put(key, tile, image_nbytes(tile))
+        return tile
+
+
+# 进程级共享实例（预算由环境变量 DECODE_CACHE_MB / OVERLAY_CACHE_MB / WATERMARK_CACHE_MB 配置）
+# 预算按进程计算：DECODE_CACHE_MB 是服务进程的上限，合成进程池的每个工作进程另有
+# DECODE_CACHE_MB / 并行数，整个部署的解码缓存最多约为 2 × DECODE_CACHE_MB
+decode_cache = DecodeCache(_budget_from_env("DECODE_CACHE_MB", 1024))
+overlay_cache = OverlayCache(_budget_from_env("OVERLAY_CACHE_MB", 64))
+watermark_logo_cache = WatermarkLogoCache(_budget_from_env("WATERMARK_CACHE_MB", 64))
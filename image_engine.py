@@ -0,0 +1,329 @@
+# image_engine.py - 产品图合成引擎
+"""
+产品图合成引擎：单张合成函数 + 背景图 × 产品图的并行批量合成。
+
+本模块不依赖 Streamlit，进程池的子进程可以直接导入使用。
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image
+from image_cache import decode_cache, overlay_cache, content_hash, image_size, DRAFT_REDUCING_GAP
+from task_pool import iter_bounded
+
+# 任务总数小于该值时使用线程池（进程启动开销比合成本身还大）
+THREAD_FALLBACK_THRESHOLD = 16
+# 合成结果预览缩略图的边长（与 tab1 预览网格的显示宽度一致）
+PREVIEW_SIZE = 110
+# 每个工作进程同时在途的任务数，用于限制已完成但未取走的结果占用的内存
+TASKS_IN_FLIGHT_PER_WORKER = 4
+
+
+def default_worker_count():
+    """默认并行数：环境变量 COMPOSE_WORKERS，否则为CPU核数"""
+    try:
+        workers = int(os.environ.get("COMPOSE_WORKERS", "0"))
+    except ValueError:
+        workers = 0
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+# ==================== 单张合成 ====================
+class PreparedBackground:
+    """已处理好的背景：缩放裁剪到输出尺寸并叠加遮罩后的RGBA图
+
+    同一背景在一次任务中只需准备一次，compose_image 可直接接收它代替原始背景图。
+    """
+    def __init__(self, image, output_size, mask_key):
+        self.image = image
+        self.output_size = output_size
+        self.mask_key = mask_key
+
+
+def _mask_key(mask_enabled, mask_color, mask_opacity):
+    """遮罩设置的规范化表示（未启用或不透明度为0时都视为无遮罩）"""
+    if mask_enabled and mask_opacity > 0:
+        return tuple(mask_color), mask_opacity
+    return None
+
+
+def prepare_background(bg_img, output_size, mask_enabled=False, mask_color=(255, 255, 255), mask_opacity=20):
+    """准备背景：调整到输出尺寸（智能裁剪铺满）并添加颜色遮罩层"""
+    # 1. 处理背景：调整到输出尺寸（智能裁剪铺满）
+    bg = bg_img.convert('RGBA')
+    bg_ratio = output_size / min(bg.width, bg.height)
+    new_width = int(bg.width * bg_ratio)
+    new_height = int(bg.height * bg_ratio)
+    bg = bg.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+    # 居中裁剪
+    left = (bg.width - output_size) // 2
+    top = (bg.height - output_size) // 2
+    right = left + output_size
+    bottom = top + output_size
+    bg = bg.crop((left, top, right, bottom))
+
+    # 2. 添加颜色遮罩层（如果启用）
+    mask_key = _mask_key(mask_enabled, mask_color, mask_opacity)
+    if mask_key:
+        # 颜色遮罩层（按设置缓存，同一设置只创建一次）
+        color_layer = overlay_cache.mask_layer(output_size, mask_color, mask_opacity)
+        # 将颜色遮罩层与背景图叠加
+        bg = Image.alpha_composite(bg, color_layer)
+
+    return PreparedBackground(bg, output_size, mask_key)
+
+
+def load_background(data, output_size, digest=None):
+    """解码背景图字节：画布远小于原图时，JPEG 按 DCT 缩放直接以较低分辨率解码
+
+    解码结果至少为铺满画布所需尺寸的 DRAFT_REDUCING_GAP 倍，再由 prepare_background 用LANCZOS缩小。
+    """
+    width, height = image_size(data)
+    scale = output_size / min(width, height) * DRAFT_REDUCING_GAP
+    return decode_cache.decode_reduced(data, (width * scale, height * scale), digest=digest)
+
+
+def compose_image(bg_img, product_img, logo_img, product_size, output_size, output_format,
+                  mask_enabled=False, mask_color=(255, 255, 255), mask_opacity=20):
+    """合成单张图片的核心函数
+    bg_img: 原始背景图，或 prepare_background() 返回的 PreparedBackground
+    mask_enabled: 是否启用遮罩
+    mask_color: 遮罩颜色RGB元组
+    mask_opacity: 遮罩层不透明度（0-100）
+    """
+    # 1-2. 背景缩放裁剪 + 颜色遮罩（已准备好的背景直接复制使用）
+    if isinstance(bg_img, PreparedBackground):
+        if (bg_img.output_size != output_size or
+                bg_img.mask_key != _mask_key(mask_enabled, mask_color, mask_opacity)):
+            raise ValueError("背景图的准备参数与当前合成设置不一致")
+        bg = bg_img.image.copy()
+    else:
+        bg = prepare_background(bg_img, output_size, mask_enabled, mask_color, mask_opacity).image
+
+    # 3. 处理产品图：调整大小并居中放置（已缩放到位的产品图不会再次缩放）
+    product = product_img.convert('RGBA')
+    product.thumbnail((product_size, product_size), Image.Resampling.LANCZOS)
+
+    # 将产品图居中放置
+    product_x = (output_size - product.width) // 2
+    product_y = (output_size - product.height) // 2
+
+    # 将产品图粘贴到背景上
+    bg.paste(product, (product_x, product_y), product)
+
+    # 4. 处理Logo图 - 直接全画布叠加（overlay_cache.logo_layer 已转换、缩放好的图层直接使用）
+    if logo_img:
+        logo = logo_img if logo_img.mode == 'RGBA' else logo_img.convert('RGBA')
+        # 确保Logo图尺寸与输出尺寸一致
+        if logo.size != (output_size, output_size):
+            logo = logo.resize((output_size, output_size), Image.Resampling.LANCZOS)
+        # 直接以遮罩方式叠加整个Logo图层
+        bg = Image.alpha_composite(bg, logo)
+
+    # 5. 根据输出格式处理背景
+    if output_format.upper() == 'JPG':
+        bg_rgb = Image.new('RGB', bg.size, (255, 255, 255))
+        bg_rgb.paste(bg, mask=bg.split()[3])
+        final_image = bg_rgb
+    else:
+        final_image = bg
+
+    return final_image
+
+
+def encode_image(image, output_format, quality=95):
+    """按输出格式编码合成结果（JPG质量95 / PNG），返回字节"""
+    buffer = BytesIO()
+    if output_format.upper() == 'JPG':
+        image.save(buffer, format='JPEG', quality=quality)
+    else:
+        image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def make_preview(image, size=PREVIEW_SIZE):
+    """从内存中的合成结果直接生成预览缩略图，返回可直接显示的编码字节
+
+    注意：会原地缩小 image，须在完整尺寸编码之后调用。
+    """
+    image.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    buffer = BytesIO()
+    if image.mode == 'RGBA':
+        image.save(buffer, format='PNG')
+    else:
+        image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+# ==================== 批量合成任务 ====================
+class ComposeJob:
+    """一次批量合成的全部输入
+
+    backgrounds / products: 图片来源列表，元素为编码后的字节或PIL图片
+    settings: compose_image 的参数（product_size、output_size、output_format、
+              mask_enabled、mask_color、mask_opacity）
+    """
+    def __init__(self, backgrounds, products, logo, settings):
+        self.backgrounds = list(backgrounds)
+        self.products = list(products)
+        self.bg_digests = [content_hash(b) if isinstance(b, bytes) else None for b in self.backgrounds]
+        self.product_digests = [content_hash(p) if isinstance(p, bytes) else None for p in self.products]
+        self.logo = logo
+        if logo is not None:
+            logo.load()  # Image.open 是惰性的，多个线程同时首次读取会出错
+        self.settings = dict(settings)
+        self._decoded = {}
+        self._prepared = {}
+        self._lock = threading.Lock()
+
+    @property
+    def total(self):
+        return len(self.backgrounds) * len(self.products)
+
+    def tasks(self):
+        """按 (背景序号, 产品序号) 顺序列出全部任务"""
+        return [(i, j) for i in range(len(self.backgrounds)) for j in range(len(self.products))]
+
+    def source_image(self, kind, index):
+        """来源图片（字节来源经由解码缓存，同一文件在本进程内只解码一次）"""
+        key = (kind, index)
+        with self._lock:
+            image = self._decoded.get(key)
+            if image is None:
+                sources, digests = ((self.backgrounds, self.bg_digests) if kind == 'bg'
+                                    else (self.products, self.product_digests))
+                source = sources[index]
+                if isinstance(source, bytes):
+                    image = decode_cache.decode(source, digest=digests[index])
+                else:
+                    image = source
+                    image.load()
+                self._decoded[key] = image
+            return image
+
+    def fitted_product(self, index):
+        """缩放到产品图边长的产品图，字节来源经由解码缓存（跨背景、跨任务复用）"""
+        size = self.settings['product_size']
+        source = self.products[index]
+        if isinstance(source, bytes):
+            return decode_cache.fitted(source, size, self.product_digests[index])
+        product = self.source_image('product', index).convert('RGBA')
+        product.thumbnail((size, size), Image.Resampling.LANCZOS)
+        return product
+
+    def prepared_background(self, index):
+        """每个背景在本进程内只缩放裁剪、叠加遮罩一次"""
+        prepared = self._prepared.get(index)
+        if prepared is None:
+            s = self.settings
+            source = self.backgrounds[index]
+            if isinstance(source, bytes):
+                bg_img = load_background(source, s['output_size'], self.bg_digests[index])
+            else:
+                bg_img = self.source_image('bg', index)
+            prepared = prepare_background(
+                bg_img, s['output_size'],
+                mask_enabled=s.get('mask_enabled', False),
+                mask_color=s.get('mask_color', (255, 255, 255)),
+                mask_opacity=s.get('mask_opacity', 20)
+            )
+            self._prepared[index] = prepared
+        return prepared
+
+    def __getstate__(self):
+        # 传给子进程时不带解码缓存和锁
+        state = self.__dict__.copy()
+        state['_decoded'] = {}
+        state['_prepared'] = {}
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class ComposeResult:
+    """单个任务的结果：编码后的图片字节，以及可选的预览缩略图字节"""
+    def __init__(self, bg_index, product_index, data, preview=None):
+        self.bg_index = bg_index
+        self.product_index = product_index
+        self.data = data
+        self.preview = preview
+
+
+def run_compose_task(job, bg_index, product_index, with_preview=False):
+    """执行单个 (背景, 产品) 合成任务"""
+    s = job.settings
+    result = compose_image(
+        job.prepared_background(bg_index), job.fitted_product(product_index), job.logo,
+        s['product_size'], s['output_size'], s['output_format'],
+        mask_enabled=s.get('mask_enabled', False),
+        mask_color=s.get('mask_color', (255, 255, 255)),
+        mask_opacity=s.get('mask_opacity', 20)
+    )
+    data = encode_image(result, s['output_format'])
+    preview = make_preview(result) if with_preview else None
+    return ComposeResult(bg_index, product_index, data, preview)
+
+
+# 工作进程内的任务数据（由进程池 initializer 设置，每个进程只传输一次）
+_worker_job = None
+
+def _init_worker(job, cache_budget):
+    """工作进程初始化：保存任务数据；解码缓存预算为服务进程预算按并行数分摊后的值"""
+    global _worker_job
+    _worker_job = job
+    decode_cache.set_budget(cache_budget)
+
+def _run_worker_task(bg_index, product_index, with_preview):
+    return run_compose_task(_worker_job, bg_index, product_index, with_preview)
+
+
+def _process_context():
+    """进程池的启动方式：forkserver，不支持时用 spawn
+
+    不直接 fork 多线程的 Streamlit 服务进程：其他会话的脚本线程、后台任务线程可能正持有
+    模块级缓存的锁，fork 出的子进程继承到已加锁的锁会永远卡住。forkserver / spawn 的子进程
+    重新导入本模块（不会执行 app.py），任务数据通过 pickle 传入（见 ComposeJob.__getstate__）。
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def iter_compose_results(job, max_workers=None, preview_limit=0, tasks=None, in_flight=None):
+    """并行合成，按完成顺序逐个产出 ComposeResult
+
+    max_workers: 并行数，默认见 default_worker_count()；为1时在当前线程串行执行
+    preview_limit: 前N个任务（按整个任务的顺序）同时生成预览缩略图
+    tasks: 只执行其中一部分 (背景序号, 产品序号)，默认为全部任务
+    in_flight: 返回当前允许同时在途的任务数的函数，每提交一批前重新读取；
+               多个任务共享CPU时用它限制本任务占用的工作进程数，而不必重建进程池
+    任务量小于 THREAD_FALLBACK_THRESHOLD 时改用线程池。
+    """
+    preview_tasks = set(job.tasks()[:preview_limit])
+    tasks = job.tasks() if tasks is None else list(tasks)
+    workers = min(max_workers or default_worker_count(), max(len(tasks), 1))
+
+    if workers <= 1:
+        for i, j in tasks:
+            yield run_compose_task(job, i, j, (i, j) in preview_tasks)
+        return
+
+    if len(tasks) < THREAD_FALLBACK_THRESHOLD:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        calls = ((run_compose_task, job, i, j, (i, j) in preview_tasks) for i, j in tasks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=_process_context(),
+                                       initializer=_init_worker,
+                                       initargs=(job, decode_cache.max_bytes // workers))
+        calls = ((_run_worker_task, i, j, (i, j) in preview_tasks) for i, j in tasks)
+
+    # 限制在途任务数量，结果取走后再提交新任务，避免已完成的结果堆积在内存中
+    # （工作进程按需启动，在途任务数同时也限制了实际启动的进程数）
+    with executor:
+        yield from iter_bounded(executor, calls, in_flight or workers * TASKS_IN_FLIGHT_PER_WORKER)
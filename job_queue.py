@@ -0,0 +1,175 @@
+# job_queue.py - 后台合成任务队列
+"""
+批量合成在后台线程中执行，不占用 Streamlit 脚本线程。
+
+按钮只负责提交任务并立即返回，页面通过轻量的定时刷新读取进度和部分结果。
+所有会话共享同一个队列：同时运行的任务数有上限，CPU按运行中的任务数
+平均分配。每个任务从头到尾只用一个进程池（每个工作进程只准备一次背景），
+份额变化时调整的是该任务同时在途的任务数，多个用户同时提交时互不饿死。
+
+输入和设置完全相同的任务共用同一个任务目录（SynthesisJob.dir），同一目录同时只运行
+一个任务：后提交的排队等前一个结束（包括已取消、正在收尾的任务），开始时重新读取清单，
+已完成的输出直接复用。
+
+任务结束后句柄只保留页面收取结果用到的设置、预览和压缩包，上传的原图和解码缓存随
+SynthesisJob 一起释放；已结束超过 FINISHED_JOB_TTL 的句柄在提交或结束任务时清除。
+"""
+import os
+import time
+import uuid
+import threading
+
+from image_engine import iter_compose_results, default_worker_count
+from zip_stream import ZipStreamWriter
+
+# 同时运行的任务数上限，超出的任务排队等待
+MAX_RUNNING_JOBS = int(os.environ.get("SYNTH_MAX_RUNNING_JOBS", 4))
+# 已结束的任务在注册表中保留的秒数
+FINISHED_JOB_TTL = 3600
+# 预览缩略图数量
+PREVIEW_LIMIT = 24
+
+
+class JobHandle:
+    """一个后台任务的状态（供页面轮询）"""
+    def __init__(self, session_id, synthesis_job, max_workers=None):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.synthesis_job = synthesis_job  # 任务结束后置为 None，释放输入图片
+        self.dir = synthesis_job.dir
+        self.settings = synthesis_job.compose_job.settings
+        self.max_workers = max_workers
+        self.status = "queued"  # queued / running / done / failed / cancelled
+        self.total = synthesis_job.compose_job.total
+        self.processed = 0
+        self.error = None
+        self.archive = None
+        self.previews = []
+        self.finished_at = None
+        self._cancelled = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    @property
+    def progress(self):
+        return self.processed / self.total if self.total else 1.0
+
+    def cancel(self):
+        self._cancelled.set()
+
+
+class JobQueue:
+    """进程内共享的任务队列与注册表（按会话索引）"""
+    def __init__(self, max_running=MAX_RUNNING_JOBS, total_workers=None):
+        self.max_running = max_running
+        self.total_workers = total_workers or default_worker_count()
+        self._jobs = {}
+        self._by_session = {}
+        self._queue = []
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def submit(self, session_id, synthesis_job, max_workers=None):
+        """提交任务；同一会话之前未完成的任务会被取消
+
+        任务目录相同的任务正在运行时，新任务排队等它结束后再开始。
+        """
+        handle = JobHandle(session_id, synthesis_job, max_workers)
+        with self._lock:
+            self._prune()
+            previous = self._jobs.get(self._by_session.get(session_id))
+            if previous is not None and previous.active:
+                previous.cancel()
+            self._jobs[handle.id] = handle
+            self._by_session[session_id] = handle.id
+            self._queue.append(handle)
+            self._start_queued()
+        return handle
+
+    def get(self, session_id):
+        """会话当前（最近一次）的任务"""
+        with self._lock:
+            return self._jobs.get(self._by_session.get(session_id))
+
+    def _prune(self):
+        now = time.time()
+        for job_id, handle in list(self._jobs.items()):
+            if handle.finished_at and now - handle.finished_at > FINISHED_JOB_TTL:
+                del self._jobs[job_id]
+                if self._by_session.get(handle.session_id) == job_id:
+                    del self._by_session[handle.session_id]
+
+    def _start_queued(self):
+        # 调用方持有锁
+        busy_dirs = {self._jobs[job_id].dir for job_id in self._running}
+        for handle in list(self._queue):
+            if handle._cancelled.is_set():
+                self._queue.remove(handle)
+                self._finish(handle, "cancelled")
+                continue
+            if len(self._running) >= self.max_running:
+                break
+            if handle.dir in busy_dirs:
+                continue
+            self._queue.remove(handle)
+            busy_dirs.add(handle.dir)
+            handle.status = "running"
+            self._running.add(handle.id)
+            threading.Thread(target=self._run, args=(handle,), daemon=True,
+                             name=f"synthesis-{handle.id[:8]}").start()
+
+    def _finish(self, handle, status):
+        # 调用方持有锁
+        handle.status = status
+        handle.finished_at = time.time()
+        handle.synthesis_job = None
+        self._prune()
+
+    def _worker_share(self, handle):
+        """当前可用的并行数：总并行数按运行中的任务平均分配（任务运行期间随时重新计算）"""
+        with self._lock:
+            share = max(1, self.total_workers // max(len(self._running), 1))
+        return min(share, handle.max_workers) if handle.max_workers else share
+
+    def _run(self, handle):
+        synthesis_job = handle.synthesis_job
+        compose_job = synthesis_job.compose_job
+        status = "done"
+        try:
+            # 排队期间同目录的前一个任务可能已写入了新的输出
+            synthesis_job.reload()
+            pending = synthesis_job.pending_tasks()
+            handle.processed = handle.total - len(pending)
+            handle.previews = synthesis_job.previews()
+            # 整个任务共用一个进程池，同时在途的任务数随份额变化；清单每 CHUNK_SIZE 张保存一次（见 record）
+            max_workers = handle.max_workers or self.total_workers
+            results = iter_compose_results(compose_job, max_workers=max_workers, preview_limit=PREVIEW_LIMIT,
+                                           tasks=pending, in_flight=lambda: self._worker_share(handle))
+            for result in results:
+                synthesis_job.record(result)
+                handle.processed += 1
+                if result.preview is not None:
+                    handle.previews = synthesis_job.previews()
+                if handle._cancelled.is_set():
+                    results.close()
+                    break
+            if handle._cancelled.is_set():
+                status = "cancelled"
+            else:
+                handle.previews = synthesis_job.previews()
+                handle.archive = synthesis_job.write_archive(ZipStreamWriter()).finish()
+        except Exception as e:
+            handle.error = e
+            status = "failed"
+        finally:
+            synthesis_job.save()
+            with self._lock:
+                self._running.discard(handle.id)
+                self._finish(handle, status)
+                self._start_queued()
+
+
+# 进程级共享实例
+job_queue = JobQueue()
@@ -0,0 +1,168 @@
+# job_store.py - 可断点续跑的批量合成任务
+"""
+批量合成任务的磁盘存储：每个任务一个目录，清单文件 manifest.json 记录
+(背景哈希, 产品哈希, 设置哈希) → 输出文件。
+
+合成结果逐张写入任务目录，清单按块保存；浏览器重连或服务重启后重新点击
+合成，会从第一个缺失的输出继续，最终ZIP直接由磁盘上的文件组装。
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+from image_cache import content_hash, image_digest, source_digest
+
+# 任务目录根路径（环境变量 SYNTH_JOB_DIR 可改到更大的磁盘）
+JOBS_ROOT = os.environ.get(
+    "SYNTH_JOB_DIR", os.path.join(tempfile.gettempdir(), "product-image-tool", "jobs")
+)
+# 每完成这么多张保存一次清单
+CHUNK_SIZE = 32
+# 超过该小时数未更新的任务目录会被清理
+JOB_TTL_HOURS = float(os.environ.get("SYNTH_JOB_TTL_HOURS", 24))
+
+MANIFEST_NAME = "manifest.json"
+
+
+def settings_hash(settings, logo=None):
+    """合成设置（含Logo内容）的哈希"""
+    payload = json.dumps(settings, sort_keys=True, default=list)
+    digest = hashlib.sha1(payload.encode())
+    if logo is not None:
+        digest.update(image_digest(logo).encode())
+    return digest.hexdigest()
+
+
+def _write_atomic(path, data):
+    """先写同目录下的唯一临时文件再替换，中途中断也不会留下半个文件，并发写同一文件也不冲突"""
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+    try:
+        with open(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def cleanup_old_jobs(root=None, ttl_hours=None):
+    """删除长时间未更新的任务目录"""
+    root = root or JOBS_ROOT
+    ttl = (JOB_TTL_HOURS if ttl_hours is None else ttl_hours) * 3600
+    if not os.path.isdir(root):
+        return
+    now = time.time()
+    for name in os.listdir(root):
+        job_dir = os.path.join(root, name)
+        manifest_path = os.path.join(job_dir, MANIFEST_NAME)
+        marker = manifest_path if os.path.exists(manifest_path) else job_dir
+        try:
+            if now - os.path.getmtime(marker) > ttl:
+                shutil.rmtree(job_dir, ignore_errors=True)
+        except OSError:
+            pass
+
+
+class SynthesisJob:
+    """可续跑的批量合成任务
+
+    compose_job: image_engine.ComposeJob
+    arcnames: {(背景序号, 产品序号): ZIP中的文件名}
+    """
+    def __init__(self, compose_job, arcnames, root=None):
+        self.compose_job = compose_job
+        self.arcnames = arcnames
+        self.settings_hash = settings_hash(compose_job.settings, compose_job.logo)
+        bg_hashes = [digest or source_digest(bg)
+                     for digest, bg in zip(compose_job.bg_digests, compose_job.backgrounds)]
+        product_hashes = [digest or source_digest(product)
+                          for digest, product in zip(compose_job.product_digests, compose_job.products)]
+        self.item_keys = {
+            (i, j): f"{bg_hashes[i]}:{product_hashes[j]}:{self.settings_hash}"
+            for i, j in compose_job.tasks()
+        }
+        job_id = content_hash("\n".join(self.item_keys[task] for task in compose_job.tasks()).encode())
+        self.dir = os.path.join(root or JOBS_ROOT, job_id[:16])
+        os.makedirs(os.path.join(self.dir, "outputs"), exist_ok=True)
+        os.makedirs(os.path.join(self.dir, "previews"), exist_ok=True)
+        self.manifest = self._load_manifest()
+        self._unsaved = 0
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.dir, MANIFEST_NAME)
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        manifest.setdefault("entries", {})
+        return manifest
+
+    def reload(self):
+        """重新读取磁盘上的清单（同目录的其他任务可能已更新）"""
+        self.manifest = self._load_manifest()
+        self._unsaved = 0
+
+    def save(self):
+        """保存清单"""
+        data = json.dumps(self.manifest, ensure_ascii=False).encode('utf-8')
+        _write_atomic(self.manifest_path, data)
+        self._unsaved = 0
+
+    def _output_path(self, entry):
+        return os.path.join(self.dir, entry["file"])
+
+    def is_done(self, task):
+        entry = self.manifest["entries"].get(self.item_keys[task])
+        return entry is not None and os.path.exists(self._output_path(entry))
+
+    def pending_tasks(self):
+        """尚未完成的任务（按任务顺序）"""
+        return [task for task in self.compose_job.tasks() if not self.is_done(task)]
+
+    @property
+    def done_count(self):
+        return self.compose_job.total - len(self.pending_tasks())
+
+    def record(self, result):
+        """把一个合成结果写入任务目录，每 CHUNK_SIZE 张保存一次清单"""
+        task = (result.bg_index, result.product_index)
+        item_key = self.item_keys[task]
+        file_id = content_hash(item_key.encode())[:20]
+        ext = os.path.splitext(self.arcnames[task])[1]
+        entry = {"file": f"outputs/{file_id}{ext}", "arcname": self.arcnames[task]}
+        _write_atomic(self._output_path(entry), result.data)
+        if result.preview is not None:
+            entry["preview"] = f"previews/{file_id}.img"
+            _write_atomic(self._output_path({"file": entry["preview"]}), result.preview)
+        self.manifest["entries"][item_key] = entry
+        self._unsaved += 1
+        if self._unsaved >= CHUNK_SIZE:
+            self.save()
+
+    def previews(self):
+        """已保存的预览缩略图，按任务顺序返回 [{"thumbnail", "filename"}]"""
+        previews = []
+        for task in self.compose_job.tasks():
+            entry = self.manifest["entries"].get(self.item_keys[task])
+            if entry and entry.get("preview"):
+                preview_path = self._output_path({"file": entry["preview"]})
+                if os.path.exists(preview_path):
+                    with open(preview_path, 'rb') as f:
+                        previews.append({"thumbnail": f.read(), "filename": entry["arcname"]})
+        return previews
+
+    def write_archive(self, zip_writer):
+        """按任务顺序把磁盘上的全部输出写入ZIP"""
+        for task in self.compose_job.tasks():
+            entry = self.manifest["entries"].get(self.item_keys[task])
+            if entry and os.path.exists(self._output_path(entry)):
+                zip_writer.add_file(self._output_path(entry), entry["arcname"])
+        return zip_writer
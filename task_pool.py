@@ -0,0 +1,39 @@
+# task_pool.py - 有界提交的并行任务迭代
+"""
+合成、水印、视频批量处理共用的提交 / 等待循环：同时在途的任务数有上限，
+结果按完成顺序产出，被取走后才继续提交，已完成的结果不会堆积在内存中。
+
+本模块不依赖 Streamlit。
+"""
+from concurrent.futures import wait, FIRST_COMPLETED
+
+
+def iter_bounded(executor, calls, in_flight, timeout=None, on_tick=None):
+    """把 calls 中的 (函数, 参数...) 逐个提交到 executor，按完成顺序产出返回值
+
+    calls: 可以是生成器，提交时才生成下一个任务的参数（如按需读取源文件）
+    in_flight: 同时在途的任务数上限；也可以是返回上限的函数，每次提交前重新读取
+    timeout / on_tick: 等待期间每隔 timeout 秒（以及每批结果产出后）在调用方线程中调用一次 on_tick
+    executor 由调用方创建和关闭；提前停止迭代时取消尚未开始的任务。
+    """
+    pending = set()
+    calls = iter(calls)
+    try:
+        while True:
+            limit = max(1, in_flight() if callable(in_flight) else in_flight)
+            while len(pending) < limit:
+                call = next(calls, None)
+                if call is None:
+                    break
+                pending.add(executor.submit(*call))
+            if not pending:
+                break
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+            if on_tick:
+                on_tick()
+    finally:
+        # 提前停止迭代时取消尚未开始的任务
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,363 @@
+# unsplash_client.py - Unsplash 图库客户端
+"""
+Unsplash 搜索与图片下载：所有请求共用一个连接池（keep-alive，失败自动重试退避）。
+
+搜索结果按 (关键词, 页码, 每页数量, 方向) 缓存在内存中（带过期时间的LRU），
+翻回看过的页不再请求；图片按URL缓存在磁盘上，同一张图只下载一次。
+所有会话共享同一个客户端（get_client），缓存和连接在会话之间复用。
+
+显示第 N 页后在后台预取第 N±1 页的搜索结果和缩略图（prefetch），翻页时直接命中缓存；
+页面上的缩略图由服务端从缓存读取后内嵌，浏览器不必再逐张请求图片。
+
+选中的背景按合成输出尺寸请求裁剪好的图片（raw 地址 + w/h/fit=crop），点击选择时就在
+后台开始下载（UnsplashPhoto），合成时直接使用，不必再从小图放大。
+
+环境变量 UNSPLASH_API_URL 可指向本地的模拟服务器（benchmarks/mock_unsplash.py），离线测试整个流程。
+本模块不依赖 Streamlit。
+"""
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+UNSPLASH_API_URL = os.environ.get("UNSPLASH_API_URL", "https://api.unsplash.com")
+# 单次请求超时（秒）
+REQUEST_TIMEOUT = 10
+# 连接池大小（同一主机最多保持的连接数）
+POOL_SIZE = 16
+# 失败重试：连接错误和 429/5xx 最多重试3次，间隔 0.3s、0.6s、1.2s
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# 当前页缩略图并行下载数，以及后台预取的线程数（两者之和不超过连接池大小）
+FETCH_WORKERS = 8
+PREFETCH_WORKERS = 4
+# 等待当前页缩略图的最长时间（秒），超时的图片改由浏览器直接加载
+THUMBNAIL_WAIT = 5
+# 背景图下载的JPEG质量（Unsplash 动态缩放参数 q）
+RENDITION_QUALITY = 90
+# 搜索结果缓存
+SEARCH_CACHE_TTL = float(os.environ.get("UNSPLASH_SEARCH_TTL", 600))
+SEARCH_CACHE_ENTRIES = 256
+# 图片磁盘缓存（环境变量 UNSPLASH_CACHE_DIR / UNSPLASH_CACHE_MB）
+DOWNLOAD_CACHE_DIR = os.environ.get(
+    "UNSPLASH_CACHE_DIR", os.path.join(tempfile.gettempdir(), "product-image-tool", "unsplash")
+)
+
+
+def _cache_bytes_from_env():
+    try:
+        return int(float(os.environ.get("UNSPLASH_CACHE_MB", 512)) * 1024 * 1024)
+    except ValueError:
+        return 512 * 1024 * 1024
+
+
+class UnsplashError(RuntimeError):
+    """Unsplash 请求失败；status_code 为 HTTP 状态码（网络错误时为 None）"""
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def make_session(pool_size=POOL_SIZE):
+    """带连接池和重试退避的 requests.Session"""
+    retry = Retry(
+        total=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# ==================== 缓存 ====================
+class TTLCache:
+    """带过期时间的LRU缓存（线程安全）"""
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskCache:
+    """按URL保存下载内容的磁盘缓存，总大小超过预算时删除最久未使用的文件"""
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total = None
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, url):
+        return os.path.join(self.root, hashlib.sha1(url.encode()).hexdigest())
+
+    def get(self, url):
+        path = self._path(url)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # 更新修改时间，作为最近使用时间
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, url, data):
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(url)
+        # 先写临时文件再替换，并发写入同一URL时不会读到半个文件
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with open(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            if self._total is None:
+                self._total = sum(size for _, size, _ in self._scan())
+            else:
+                self._total += len(data)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        """(路径, 大小, 修改时间)"""
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith(".part"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except OSError:
+                continue
+            entries.append((os.path.join(self.root, name), stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._scan(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        # 删到预算的 90%，避免每次写入都触发清理
+        for path, size, _ in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total = total
+
+
+# ==================== 客户端 ====================
+class UnsplashClient:
+    """Unsplash API 客户端（线程安全，可在多个会话和后台线程之间共享）"""
+    def __init__(self, access_key, base_url=None, cache_dir=None, cache_bytes=None, session=None):
+        self.access_key = access_key
+        self.base_url = (base_url or UNSPLASH_API_URL).rstrip("/")
+        self.session = session or make_session()
+        self.search_cache = TTLCache(SEARCH_CACHE_ENTRIES, SEARCH_CACHE_TTL)
+        self.download_cache = DiskCache(cache_dir or DOWNLOAD_CACHE_DIR,
+                                        _cache_bytes_from_env() if cache_bytes is None else cache_bytes)
+        self._fetch_pool = ThreadPoolExecutor(FETCH_WORKERS, thread_name_prefix="unsplash-fetch")
+        self._prefetch_pool = ThreadPoolExecutor(PREFETCH_WORKERS, thread_name_prefix="unsplash-prefetch")
+        # 进行中的下载/搜索（同一URL或查询同时只请求一次）
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def _get(self, url, **kwargs):
+        try:
+            response = self.session.get(url, timeout=REQUEST_TIMEOUT, **kwargs)
+        except requests.RequestException as e:
+            raise UnsplashError(f"请求失败: {e}") from e
+        if response.status_code != 200:
+            raise UnsplashError(f"HTTP {response.status_code}", response.status_code)
+        return response
+
+    def search(self, query, page=1, per_page=12, orientation="squarish"):
+        """搜索图片，返回 (结果列表, 总页数, 总数)；同一查询在缓存有效期内只请求一次"""
+        key = (query, page, per_page, orientation)
+        cached = self.search_cache.get(key)
+        if cached is not None:
+            return cached
+        response = self._get(
+            f"{self.base_url}/search/photos",
+            headers={"Authorization": f"Client-ID {self.access_key}"},
+            params={"query": query, "page": page, "per_page": per_page, "orientation": orientation},
+        )
+        data = response.json()
+        total = data.get("total", 0)
+        total_pages = data.get("total_pages", 0)
+        # 如果API没有返回total_pages，按总数计算
+        if total_pages == 0 and total > 0:
+            total_pages = (total + per_page - 1) // per_page
+        result = (data.get("results", []), min(total_pages, 1000), total)
+        self.search_cache.put(key, result)
+        return result
+
+    def fetch(self, url):
+        """下载图片字节（按URL缓存在磁盘上）"""
+        data = self.download_cache.get(url)
+        if data is not None:
+            return data
+        data = self._get(url).content
+        self.download_cache.put(url, data)
+        return data
+
+    # ---------- 并行下载与预取 ----------
+    def _submit(self, key, pool, func, *args):
+        """提交任务；同一 key 已在进行中时返回已有的 Future"""
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = pool.submit(func, *args)
+            self._inflight[key] = future
+
+        def done(_, key=key):
+            with self._inflight_lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+
+        future.add_done_callback(done)
+        return future
+
+    def fetch_async(self, url, background=False):
+        """在线程池中下载，返回 Future；background=True 时使用预取线程池"""
+        pool = self._prefetch_pool if background else self._fetch_pool
+        return self._submit(("fetch", url), pool, self.fetch, url)
+
+    def fetch_many(self, urls, timeout=THUMBNAIL_WAIT):
+        """并行下载多张图片，返回 {url: 字节}；失败或超时的图片不在结果中"""
+        futures = {url: self.fetch_async(url) for url in dict.fromkeys(urls)}
+        wait(futures.values(), timeout=timeout)
+        return {url: future.result() for url, future in futures.items()
+                if future.done() and not future.exception()}
+
+    def prefetch(self, query, page, total_pages, per_page=12, orientation="squarish"):
+        """后台预取第 page±1 页的搜索结果及其缩略图（立即返回）"""
+        for neighbor in (page + 1, page - 1):
+            if 1 <= neighbor <= total_pages:
+                self._submit(("search", query, neighbor, per_page, orientation), self._prefetch_pool,
+                             self._prefetch_page, query, neighbor, per_page, orientation)
+
+    def _prefetch_page(self, query, page, per_page, orientation):
+        photos, _, _ = self.search(query, page, per_page, orientation)
+        for photo in photos:
+            url = thumbnail_url(photo)
+            if url:
+                self.fetch_async(url, background=True)
+
+
+def thumbnail_url(photo):
+    """网格显示用的缩略图地址（200px 宽的 thumb，没有时用 small）"""
+    urls = photo.get("urls", {})
+    return urls.get("thumb") or urls.get("small")
+
+
+def rendition_url(photo, size):
+    """裁剪为 size × size 的背景图地址：在 raw 地址上加 Unsplash 动态缩放参数
+
+    合成时背景按输出尺寸居中裁剪为正方形，这里请求的就是同样的裁剪结果。
+    没有 raw 地址时退回 regular / small。
+    """
+    urls = photo.get("urls", {})
+    raw = urls.get("raw")
+    if not raw:
+        return urls.get("regular") or urls.get("small")
+    parts = urlsplit(raw)
+    params = dict(parse_qsl(parts.query))
+    params.update({"w": str(size), "h": str(size), "fit": "crop", "fm": "jpg", "q": str(RENDITION_QUALITY)})
+    return urlunsplit(parts._replace(query=urlencode(params)))
+
+
+class UnsplashPhoto:
+    """选中的 Unsplash 背景：创建时就在后台开始下载合成尺寸的图片
+
+    name / type 与上传文件一致，合成时用 data(size) 取得图片字节（未下载完时等待）；
+    输出尺寸改变后按新尺寸重新下载。多张选中的图片共用客户端的下载线程池并发下载，
+    先对每张调用 request(size) 再逐张 data()，就不会一张张排队。
+    """
+    def __init__(self, client, photo, name, size):
+        self.client = client
+        self.photo = photo
+        self.name = name
+        self.type = "image/jpeg"
+        self.size = size
+        self._future = client.fetch_async(rendition_url(photo, size))
+
+    @property
+    def ready(self):
+        return self._future.done()
+
+    def request(self, size):
+        """按新尺寸开始下载（尺寸未变时什么都不做），不等待结果"""
+        if size and size != self.size:
+            self.size = size
+            self._future = self.client.fetch_async(rendition_url(self.photo, size))
+
+    def data(self, size=None):
+        self.request(size)
+        return self._future.result()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(access_key):
+    """进程内共享的客户端（每个API密钥一个）"""
+    with _clients_lock:
+        client = _clients.get(access_key)
+        if client is None:
+            client = _clients[access_key] = UnsplashClient(access_key)
+        return client
@@ -0,0 +1,568 @@
+# video_engine.py - 视频抽帧引擎
+"""
+基于 ffmpeg 子进程的视频抽帧：解码 → 丢弃指定帧 → 一次编码，原始音频流直接复制。
+
+智能渲染模式只重新编码包含被删帧的GOP（两个关键帧之间的片段），其余片段和音频
+直接复制，耗时取决于GOP长度而不是视频长度。
+
+ffmpeg 可执行文件由 imageio-ffmpeg 提供，不依赖系统安装。
+批量处理时每个视频由一个 ffmpeg 子进程完成，并行数按CPU核数和编码线程数折算。
+每个任务的中间文件都放在独立的临时目录中，多个会话同时处理视频互不影响。
+本模块不依赖 Streamlit。
+"""
+import os
+import time
+import random
+import shutil
+import tempfile
+import threading
+import subprocess
+from fractions import Fraction
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import imageio_ffmpeg
+
+from task_pool import iter_bounded
+
+# 视频任务临时目录的根路径（环境变量 VIDEO_SCRATCH_DIR 可改到本地SSD或tmpfs）
+SCRATCH_ROOT = os.environ.get(
+    "VIDEO_SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "product-image-tool", "video")
+)
+# 超过该小时数未更新的临时目录（进程被强制结束时遗留）会被清理
+SCRATCH_TTL_HOURS = float(os.environ.get("VIDEO_SCRATCH_TTL_HOURS", 6))
+WORKSPACE_PREFIX = "video-job-"
+# 批量处理"保存到输出目录"时的根目录，页面只能选择其下的子目录
+OUTPUT_ROOT = os.environ.get("VIDEO_OUTPUT_DIR", "output_videos")
+UPLOAD_PREFIX = "video-upload-"
+# 视频信息缓存的条目数（每条只有元数据和关键帧序号）
+PROBE_CACHE_ENTRIES = 256
+# 页面预览视频的大小上限（st.video 会把整个文件读入内存）
+PREVIEW_MAX_BYTES = int(float(os.environ.get("VIDEO_PREVIEW_MAX_MB", 200)) * 1024 * 1024)
+# 输出视频编码参数（CRF 18 接近视觉无损）
+X264_PRESET = "medium"
+X264_CRF = 18
+# 可以直接复制进 MP4 容器的音频编码，其他编码转为 AAC
+MP4_AUDIO_CODECS = {'aac', 'mp3', 'alac', 'ac3', 'eac3', 'opus', 'flac'}
+# 批量处理时每个任务的编码线程数上限（x264 自身会多线程编码，并行任务数按此折算）
+MAX_ENCODER_THREADS = 4
+# 智能渲染：需要重新编码的帧超过该比例时直接整段重新编码
+SMART_RENDER_MAX_FRACTION = 0.5
+# 重新编码片段使用的 SPS/PPS 编号，与原视频（通常为0）区分，拼接后解码器可同时持有两套参数
+SMART_RENDER_SPS_ID = 7
+# ffmpeg 出错时保留的错误输出行数（错误信息在最后几行）
+STDERR_TAIL_LINES = 50
+
+
+# framecrc 输出的包标志
+PACKET_FLAG_KEY = 0x1
+PACKET_FLAG_DISCARD = 0x4
+
+
+class FFmpegError(RuntimeError):
+    """ffmpeg 执行失败"""
+
+
+def ffmpeg_exe():
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def _x264_args(threads=None):
+    """H.264 编码参数；threads 为 None 时由 x264 按CPU核数自动决定"""
+    args = ["-c:v", "libx264", "-preset", X264_PRESET, "-crf", str(X264_CRF), "-pix_fmt", "yuv420p"]
+    if threads:
+        args += ["-threads", str(threads)]
+    return args
+
+
+# ==================== 任务临时目录 ====================
+def create_workspace(label="job", root=None):
+    """创建一个任务独立的临时目录，由调用方用 release_workspace 删除（遗留的由定期清理删除）"""
+    root = root or SCRATCH_ROOT
+    os.makedirs(root, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f"{WORKSPACE_PREFIX}{label}-", dir=root)
+
+
+def release_workspace(workdir):
+    if workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+@contextmanager
+def job_workspace(label="job", root=None):
+    """为一个任务创建独立的临时目录，退出时（包括异常和中断）连同内容一起删除"""
+    workdir = create_workspace(label, root)
+    try:
+        yield workdir
+    finally:
+        release_workspace(workdir)
+
+
+def cleanup_stale_workspaces(root=None, ttl_hours=None):
+    """删除长时间未更新的任务临时目录和上传缓存文件（只处理本模块创建的文件）"""
+    root = root or SCRATCH_ROOT
+    ttl = (SCRATCH_TTL_HOURS if ttl_hours is None else ttl_hours) * 3600
+    if not os.path.isdir(root):
+        return
+    now = time.time()
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if not name.startswith((WORKSPACE_PREFIX, UPLOAD_PREFIX)):
+            continue
+        try:
+            if now - os.path.getmtime(path) > ttl:
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+        except OSError:
+            pass
+
+
+def resolve_output_dir(subfolder="", root=None):
+    """把页面填写的子目录名解析为输出根目录（默认 OUTPUT_ROOT）下的路径，不创建目录
+
+    只接受相对路径：绝对路径、含 ".." 或经符号链接指向根目录之外时抛出 ValueError。
+    """
+    root = os.path.realpath(root or OUTPUT_ROOT)
+    subfolder = (subfolder or "").strip()
+    if os.path.isabs(subfolder) or ".." in subfolder.replace("\\", "/").split("/"):
+        raise ValueError("只能填写输出目录下的子目录名，不能使用绝对路径或 ..")
+    path = os.path.realpath(os.path.join(root, subfolder))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError("子目录不能指向输出目录之外")
+    return path
+
+
+def stage_upload(fileobj, name, digest, root=None, chunk_size=1024 * 1024):
+    """把上传的视频分块复制到以内容哈希命名的文件，返回路径
+
+    同一内容（包括页面重新运行和其他会话上传的相同文件）只写一次；
+    先写临时文件再改名，并发写入同一内容时也不会读到半个文件。
+    """
+    root = root or SCRATCH_ROOT
+    os.makedirs(root, exist_ok=True)
+    ext = os.path.splitext(name)[1].lower() or ".mp4"
+    path = os.path.join(root, f"{UPLOAD_PREFIX}{digest}{ext}")
+    if os.path.exists(path):
+        # 更新修改时间，正在使用的文件不会被定期清理删除
+        os.utime(path)
+        return path
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{UPLOAD_PREFIX}{digest}-", suffix=".part", dir=root)
+    try:
+        position = fileobj.tell()
+        fileobj.seek(0)
+        with open(fd, 'wb') as f:
+            shutil.copyfileobj(fileobj, f, chunk_size)
+        fileobj.seek(position)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+# ==================== 视频信息 ====================
+def _codec_name(codec):
+    """'h264 (High) (avc1 / 0x31637661)' → 'h264'"""
+    return codec.split()[0].strip(',').lower() if codec else None
+
+
+def probe_video(path):
+    """读取视频基本信息：帧率、帧数、分辨率、时长、视频/音频编码"""
+    reader = imageio_ffmpeg.read_frames(path)
+    try:
+        meta = next(reader)
+    finally:
+        reader.close()
+    fps = meta.get('fps') or 0
+    duration = meta.get('duration') or 0
+    width, height = meta.get('size') or (0, 0)
+    return {
+        "total_frames": int(round(duration * fps)),
+        "fps": fps,
+        "width": width,
+        "height": height,
+        "duration": duration,
+        "codec": _codec_name(meta.get('codec')),
+        "pix_fmt": (meta.get('pix_fmt') or '').split('(')[0] or None,
+        "audio_codec": _codec_name(meta.get('audio_codec')),
+    }
+
+
+def packet_index(path):
+    """只读取视频流的包头（不解码）：精确帧数和关键帧的显示序号
+
+    返回 {"frame_count": 帧数, "keyframes": [关键帧序号, ...]}
+    """
+    result = subprocess.run(
+        [ffmpeg_exe(), "-v", "error", "-nostdin", "-i", path, "-map", "0:v:0", "-c", "copy", "-f", "framecrc", "-"],
+        capture_output=True
+    )
+    if result.returncode != 0:
+        raise FFmpegError(result.stderr.decode(errors='ignore').strip())
+    packets = []
+    for line in result.stdout.decode(errors='ignore').splitlines():
+        if not line or line.startswith('#'):
+            continue
+        fields = [field.strip() for field in line.split(',')]
+        dts, pts = fields[1], fields[2]
+        timestamp = int(pts) if pts.lstrip('-').isdigit() else int(dts)
+        # framecrc 只在标志不是单纯的关键帧时输出 F=（0x1 关键帧，0x4 被编辑列表裁掉、不会显示的包）
+        flags = next((int(field[2:], 16) for field in fields[6:] if field.startswith('F=')), PACKET_FLAG_KEY)
+        if flags & PACKET_FLAG_DISCARD:
+            continue
+        packets.append((timestamp, bool(flags & PACKET_FLAG_KEY)))
+    # 包按解码顺序排列，按时间戳排序得到显示顺序
+    order = sorted(range(len(packets)), key=lambda i: packets[i][0])
+    keyframes = [rank for rank, i in enumerate(order) if packets[i][1]]
+    return {"frame_count": len(packets), "keyframes": keyframes}
+
+
+def probe_video_exact(path):
+    """probe_video 的结果加上读取包头（不解码）得到的精确帧数和关键帧序号，不缓存"""
+    info = probe_video(path)
+    index = packet_index(path)
+    info["total_frames"] = index["frame_count"]
+    info["keyframes"] = index["keyframes"]
+    return info
+
+
+class ProbeCache:
+    """视频信息缓存：按文件内容哈希（或路径 + 修改时间 + 大小）保存 probe_video 的结果
+
+    exact=True 时额外读取包头（不解码）得到精确帧数和关键帧序号，
+    total_frames 使用精确帧数（可变帧率视频按时长 × 帧率估算并不准确），
+    keyframes 供智能渲染直接使用，不必再次读取。
+    """
+    def __init__(self, max_entries=PROBE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def probe(self, path, digest=None, exact=True):
+        """返回视频信息字典（副本，调用方可以修改）"""
+        if digest:
+            key = (digest, exact)
+        else:
+            stat = os.stat(path)
+            key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, exact)
+        with self._lock:
+            info = self._entries.get(key)
+            if info is not None:
+                self._entries.move_to_end(key)
+                return dict(info)
+        info = probe_video_exact(path) if exact else probe_video(path)
+        with self._lock:
+            self._entries[key] = info
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return dict(info)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+probe_cache = ProbeCache()
+
+
+def frame_rate_fraction(fps):
+    """把探测到的帧率（如 29.97）还原为精确分数（30000/1001）"""
+    ntsc = round(fps * 1.001)
+    if abs(fps - ntsc * 1000 / 1001) < 0.005 and abs(fps - round(fps)) > 0.005:
+        return Fraction(ntsc * 1000, 1001)
+    return Fraction(fps).limit_denominator(1000)
+
+
+def pick_frames_to_remove(total_frames, count=2):
+    """随机选择要删除的帧（不重复，避开首尾帧以防编码问题）"""
+    if total_frames <= count:
+        raise ValueError("视频太短，不足以移除两帧。")
+    available_frames = range(1, total_frames - 1)
+    if len(available_frames) >= count:
+        return sorted(random.sample(available_frames, count))
+    return sorted(random.sample(range(total_frames), count))
+
+
+# ==================== 单次编码抽帧 ====================
+def _select_filter(frames_to_remove, rate):
+    """丢弃指定帧并按原帧率重新生成连续时间戳的滤镜"""
+    dropped = "+".join(f"eq(n\\,{n})" for n in frames_to_remove)
+    return f"select='not({dropped})',setpts=N/({rate})/TB"
+
+
+def _audio_modes(audio_codec):
+    """依次尝试的音频处理方式：能放入MP4的直接复制，否则转AAC，都失败时输出无音频视频"""
+    if audio_codec is None:
+        return ["none"]
+    if audio_codec in MP4_AUDIO_CODECS:
+        return ["copy", "aac", "none"]
+    return ["aac", "none"]
+
+
+def _audio_args(audio_mode, input_index=0):
+    if audio_mode == "copy":
+        return ["-map", f"{input_index}:a:0?", "-c:a", "copy"]
+    if audio_mode == "aac":
+        return ["-map", f"{input_index}:a:0?", "-c:a", "aac", "-b:a", "192k"]
+    return ["-an"]
+
+
+def _drain_stderr(stream, lines):
+    """后台线程持续读取 ffmpeg 的错误输出，只保留最后几行
+
+    stderr 管道写满（约64KB）后 ffmpeg 会阻塞，不再输出进度，读取 stdout 的一方随之卡住，
+    所以必须和 stdout 同时读取。
+    """
+    with stream:
+        for line in stream:
+            lines.append(line)
+
+
+def _run_ffmpeg(args, total_frames=0, progress_callback=None):
+    """运行 ffmpeg，通过 -progress 输出回报已编码帧数，返回最终帧数"""
+    cmd = [ffmpeg_exe(), "-y", "-v", "error", "-nostdin", "-progress", "pipe:1", "-nostats"] + args
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr_lines = deque(maxlen=STDERR_TAIL_LINES)
+    drainer = threading.Thread(target=_drain_stderr, args=(process.stderr, stderr_lines), daemon=True)
+    drainer.start()
+    frames = 0
+    try:
+        for line in process.stdout:
+            key, _, value = line.decode(errors='ignore').strip().partition("=")
+            if key == "frame" and value.isdigit():
+                frames = int(value)
+                if progress_callback and total_frames > 0:
+                    progress_callback(min(frames / total_frames, 1.0))
+    except BaseException:
+        # 调用方被中断（如页面重新运行）时结束子进程，避免它继续写入已删除的临时目录
+        process.kill()
+        process.wait()
+        drainer.join()
+        raise
+    returncode = process.wait()
+    drainer.join()
+    if returncode != 0:
+        stderr = b"".join(stderr_lines).decode(errors='ignore')
+        raise FFmpegError(stderr.strip() or f"ffmpeg 退出码 {returncode}")
+    return frames
+
+
+def drop_frames(input_path, output_path, frames_to_remove, video_info, progress_callback=None, threads=None):
+    """一次编码完成抽帧：视频重新编码为 H.264，音频流原样复制
+
+    音频编码无法放入MP4时转为AAC，仍然失败则输出无音频视频。
+    返回 (输出帧数, 音频处理方式 copy / aac / none)。
+    """
+    # 输出帧率与时间戳使用同一个精确帧率，恒定帧率输出时不会再补帧或丢帧
+    rate = frame_rate_fraction(video_info["fps"])
+    video_args = [
+        "-map", "0:v:0",
+        "-vf", _select_filter(frames_to_remove, rate), "-r", str(rate),
+    ] + _x264_args(threads)
+    last_error = None
+    for audio_mode in _audio_modes(video_info.get("audio_codec")):
+        try:
+            frames = _run_ffmpeg(
+                ["-i", input_path] + video_args + _audio_args(audio_mode) +
+                ["-movflags", "+faststart", output_path],
+                video_info.get("total_frames", 0), progress_callback
+            )
+            return frames, audio_mode
+        except FFmpegError as e:
+            last_error = e
+            if os.path.exists(output_path):
+                os.remove(output_path)
+    raise last_error
+
+
+# ==================== 智能渲染（只重新编码受影响的GOP） ====================
+def affected_ranges(keyframes, frame_count, frames_to_remove):
+    """包含被删帧的GOP区间 [起始关键帧, 下一个关键帧)，相邻或重复的合并"""
+    ranges = []
+    for frame in sorted(frames_to_remove):
+        start = max(k for k in keyframes if k <= frame)
+        end = next((k for k in keyframes if k > frame), frame_count)
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def _concat_line(path):
+    return "file '" + path.replace("'", "'\\''") + "'\n"
+
+
+def smart_drop_frames(input_path, output_path, frames_to_remove, video_info, progress_callback=None,
+                      scratch_dir=None, threads=None):
+    """只重新编码包含被删帧的GOP，其余视频片段和音频直接复制
+
+    仅支持 H.264 / yuv420p 且以关键帧开头的视频，不满足条件或需要重新编码的部分
+    过大时返回 None，由调用方改用 drop_frames 整段重新编码。
+    中间片段写在 scratch_dir（默认 SCRATCH_ROOT）下的独立临时目录中，结束后删除。
+    返回 (输出帧数, 音频处理方式)。
+    """
+    if video_info.get("codec") != "h264" or video_info.get("pix_fmt") != "yuv420p":
+        return None
+    if "keyframes" in video_info:
+        # 由 ProbeCache 精确模式读取过包头
+        frame_count, keyframes = video_info["total_frames"], video_info["keyframes"]
+    else:
+        index = packet_index(input_path)
+        frame_count, keyframes = index["frame_count"], index["keyframes"]
+    if not keyframes or keyframes[0] != 0 or max(frames_to_remove) >= frame_count:
+        return None
+    ranges = affected_ranges(keyframes, frame_count, frames_to_remove)
+    reencode_frames = sum(end - start for start, end in ranges)
+    if reencode_frames > frame_count * SMART_RENDER_MAX_FRACTION:
+        return None
+
+    with job_workspace("smart", scratch_dir) as workdir:
+        # 1. 在受影响GOP的边界处切开（只复制，不解码）
+        boundaries = sorted({b for r in ranges for b in r} - {0, frame_count})
+        segment_pattern = os.path.join(workdir, "segment_%04d.mp4")
+        _run_ffmpeg(["-i", input_path, "-map", "0:v:0", "-c", "copy", "-f", "segment", "-segment_format", "mp4",
+                     "-segment_frames", ",".join(map(str, boundaries)), "-reset_timestamps", "1", segment_pattern])
+        starts = [0] + boundaries
+        ends = boundaries + [frame_count]
+        segments = [segment_pattern % i for i in range(len(starts))]
+        if not all(os.path.exists(path) for path in segments):
+            return None
+
+        # 2. 重新编码受影响的片段（片段帧数与预期不符说明不是封闭GOP，放弃智能渲染）
+        rate = frame_rate_fraction(video_info["fps"])
+        done_frames = 0
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            if (start, end) not in ranges:
+                continue
+            if packet_index(segments[i])["frame_count"] != end - start:
+                return None
+            local_frames = [frame - start for frame in frames_to_remove if start <= frame < end]
+            reencoded = os.path.join(workdir, f"reencoded_{i:04d}.mp4")
+
+            def segment_progress(fraction, offset=done_frames, size=end - start):
+                if progress_callback:
+                    progress_callback(min((offset + fraction * size) / reencode_frames, 1.0))
+
+            _run_ffmpeg([
+                "-i", segments[i], "-vf", _select_filter(local_frames, rate), "-r", str(rate),
+            ] + _x264_args(threads) + [
+                "-x264-params", f"sps-id={SMART_RENDER_SPS_ID}:repeat-headers=1", reencoded,
+            ], end - start, segment_progress)
+            segments[i] = reencoded
+            done_frames += end - start
+
+        # 3. 拼接全部片段，音频从原视频复制
+        # 重新编码的片段和原片段各有一套参数集，avcC 只能放第一个片段的那套，其余的在样本中（带内）；
+        # 标记为 avc3（允许带内参数集），否则只读 avcC 的播放器（浏览器、硬件解码）会花屏或拒绝播放
+        concat_list = os.path.join(workdir, "concat.txt")
+        with open(concat_list, 'w', encoding='utf-8') as f:
+            f.writelines(_concat_line(path) for path in segments)
+        last_error = None
+        for audio_mode in _audio_modes(video_info.get("audio_codec")):
+            try:
+                _run_ffmpeg(["-f", "concat", "-safe", "0", "-i", concat_list, "-i", input_path,
+                             "-map", "0:v:0", "-c:v", "copy", "-tag:v", "avc3"] + _audio_args(audio_mode, 1) +
+                            ["-movflags", "+faststart", output_path])
+                return frame_count - len(set(frames_to_remove)), audio_mode
+            except FFmpegError as e:
+                last_error = e
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+        raise last_error
+
+
+def remove_frames(input_path, output_path, frames_to_remove, video_info, progress_callback=None, smart=True,
+                  threads=None):
+    """删除指定帧：优先智能渲染，不支持时整段重新编码
+
+    返回 (输出帧数, 音频处理方式, 处理方式 smart / full)。
+    """
+    if smart:
+        result = smart_drop_frames(input_path, output_path, frames_to_remove, video_info, progress_callback,
+                                   threads=threads)
+        if result is not None:
+            return result + ("smart",)
+    return drop_frames(input_path, output_path, frames_to_remove, video_info, progress_callback,
+                       threads) + ("full",)
+
+
+# ==================== 批量处理 ====================
+def default_video_workers():
+    """默认并行任务数：环境变量 VIDEO_WORKERS，否则为 CPU核数 / 每个任务的编码线程数"""
+    try:
+        workers = int(os.environ.get("VIDEO_WORKERS", "0"))
+    except ValueError:
+        workers = 0
+    if workers > 0:
+        return workers
+    cpus = os.cpu_count() or 1
+    return max(1, cpus // min(cpus, MAX_ENCODER_THREADS))
+
+
+class VideoResult:
+    """一个视频的处理结果；失败时 error 为错误信息，output_path 不存在"""
+    def __init__(self, index, name, output_path, video_info=None, frames_removed=None, saved_frames=0,
+                 audio_mode=None, error=None):
+        self.index = index
+        self.name = name
+        self.output_path = output_path
+        self.video_info = video_info
+        self.frames_removed = frames_removed
+        self.saved_frames = saved_frames
+        self.audio_mode = audio_mode
+        self.error = error
+
+
+def run_video_task(index, name, input_path, output_path, smart=True, threads=None, progress_callback=None,
+                   digest=None):
+    """处理一个视频：读取信息 → 随机选两帧 → 删除，video_info["render_mode"] 记录处理方式
+
+    digest: 输入文件的内容哈希，有则按哈希缓存视频信息；输入通常是一次性的临时路径，
+    没有哈希时按路径缓存永远不会再命中，所以直接读取。
+    """
+    try:
+        video_info = probe_cache.probe(input_path, digest) if digest else probe_video_exact(input_path)
+        frames_to_remove = pick_frames_to_remove(video_info["total_frames"])
+        saved_count, audio_mode, render_mode = remove_frames(
+            input_path, output_path, frames_to_remove, video_info, progress_callback, smart=smart, threads=threads
+        )
+        video_info["render_mode"] = render_mode
+        return VideoResult(index, name, output_path, video_info, frames_to_remove, saved_count, audio_mode)
+    except Exception as e:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        # ffmpeg 的错误信息较长，只保留最后一行
+        lines = [line.strip() for line in str(e).splitlines() if line.strip()]
+        return VideoResult(index, name, output_path, error=lines[-1] if lines else type(e).__name__)
+
+
+def iter_video_results(jobs, smart=True, max_workers=None, progress=None, on_tick=None, tick_interval=0.5):
+    """并行处理多个视频，按完成顺序逐个产出 VideoResult
+
+    jobs: [(名称, 输入路径, 输出路径, 内容哈希或 None), ...]
+    编码在 ffmpeg 子进程中进行，工作线程只等待子进程输出，因此用线程池即可并行；
+    每个任务的编码线程数为 CPU核数 / 并行数，避免多个 x264 争抢CPU。
+    progress: 可选的字典，各任务的进度（0~1）按序号写入；
+    on_tick: 可选回调，等待期间每隔 tick_interval 秒在调用方线程中调用一次（用于刷新进度显示）。
+    """
+    workers = min(max_workers or default_video_workers(), max(len(jobs), 1))
+    threads = max(1, (os.cpu_count() or 1) // workers) if workers > 1 else None
+
+    def task(index, name, input_path, output_path, digest):
+        def report(fraction):
+            if progress is not None:
+                progress[index] = fraction
+        return run_video_task(index, name, input_path, output_path, smart, threads, report, digest)
+
+    # 输入已在磁盘上，在途任务数等于并行数即可
+    calls = ((task, index, *job) for index, job in enumerate(jobs))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for result in iter_bounded(executor, calls, workers, timeout=tick_interval, on_tick=on_tick):
+            if progress is not None:
+                progress[result.index] = 1.0
+            yield result
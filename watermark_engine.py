@@ -0,0 +1,166 @@
+# watermark_engine.py - Logo水印引擎
+"""
+Logo水印添加：单张处理函数 + 多张图片（或ZIP压缩包）的并行批量处理。
+
+批量处理按需读取源文件，在线程池中完成解码、加水印和编码，结果逐个产出，
+由调用方直接写入 ZipStreamWriter；同时在途的图片数量有上限，内存占用保持有界。
+Pillow 的解码、缩放、合成和编码都会释放GIL，线程池即可利用多核。
+
+本模块不依赖 Streamlit。
+"""
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image
+
+from image_engine import default_worker_count, TASKS_IN_FLIGHT_PER_WORKER
+from image_cache import decode_cache, watermark_logo_cache
+from task_pool import iter_bounded
+
+# 批量模式支持的图片格式
+WATERMARK_IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+# 实时预览代理图的宽度（与 tab3 预览区显示宽度一致）
+PREVIEW_DISPLAY_WIDTH = 600
+
+
+# ==================== 单张处理 ====================
+def logo_box(base_size, logo_tile_size, x_percent, y_percent):
+    """Logo在底图上的位置（基于百分比），返回左上角坐标"""
+    base_width, base_height = base_size
+    logo_width, logo_height = logo_tile_size
+    x_pos = int((base_width - logo_width) * (x_percent / 100))
+    y_pos = int((base_height - logo_height) * (y_percent / 100))
+    return x_pos, y_pos
+
+
+def add_logo(base_image, logo_image, x_percent, y_percent, size_percent, opacity, in_place=False):
+    """将Logo添加到图片上，返回RGBA结果（出错时抛出异常）
+
+    只在Logo所在的区域内合成；缩放、调好透明度的Logo按 (Logo, 边长, 透明度) 缓存。
+    in_place: 底图已是RGBA且调用方不再需要原图时，直接在底图上修改，省去一次整图复制。
+    """
+    base_img = base_image if in_place and base_image.mode == 'RGBA' else base_image.convert('RGBA')
+
+    # 计算Logo的实际尺寸（基于图片宽高的百分比）
+    base_width, base_height = base_img.size
+    logo_size = int(min(base_width, base_height) * (size_percent / 100))
+    tile = watermark_logo_cache.get(logo_image, logo_size, opacity)
+
+    # 计算Logo位置，裁掉超出底图的部分
+    x_pos, y_pos = logo_box(base_img.size, tile.size, x_percent, y_percent)
+    left, top = max(x_pos, 0), max(y_pos, 0)
+    right, bottom = min(x_pos + tile.width, base_width), min(y_pos + tile.height, base_height)
+    if right > left and bottom > top:
+        base_img.alpha_composite(tile, (left, top), (left - x_pos, top - y_pos, right - x_pos, bottom - y_pos))
+    return base_img
+
+
+def encode_watermarked(image, output_format, quality=95):
+    """编码加水印后的图片：JPG先合并到白底（质量95），PNG保留透明度"""
+    buffer = BytesIO()
+    if output_format.upper() == 'JPG':
+        if image.mode == 'RGBA':
+            rgb_img = Image.new('RGB', image.size, (255, 255, 255))
+            rgb_img.paste(image, mask=image.split()[3])
+            image = rgb_img
+        image.save(buffer, format='JPEG', quality=quality)
+    else:
+        image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def watermarked_name(original_name, index, output_format):
+    """输出文件名：原文件名_with_logo_序号.扩展名"""
+    name_without_ext = os.path.splitext(os.path.basename(original_name))[0]
+    ext = '.jpg' if output_format.upper() == 'JPG' else '.png'
+    return f"{name_without_ext}_with_logo_{index + 1:03d}{ext}"
+
+
+# ==================== 实时预览 ====================
+def preview_proxy(data, digest=None, max_width=PREVIEW_DISPLAY_WIDTH, session_id=None):
+    """显示尺寸的RGBA代理图（经由解码缓存，每个文件只解码、缩放一次）
+
+    返回 (代理图, 原图尺寸)。代理图是共享对象，调用方不要原地修改。
+    """
+    # 只读取文件头获取原图尺寸，不解码像素
+    with Image.open(BytesIO(data)) as img:
+        original_size = img.size
+    # 只限制宽度（与预览区按宽度显示一致）
+    proxy = decode_cache.thumbnail(data, (max_width, original_size[1]), 'RGBA', digest, session_id)
+    return proxy, original_size
+
+
+def render_preview(proxy, logo_image, x_percent, y_percent, size_percent, opacity):
+    """在代理图上加水印，合并到白底后返回RGB预览（与下载的JPG效果一致）"""
+    result = add_logo(proxy, logo_image, x_percent, y_percent, size_percent, opacity)
+    preview = Image.new('RGB', result.size, (255, 255, 255))
+    preview.paste(result, mask=result.getchannel('A'))
+    return preview
+
+
+# ==================== 批量处理 ====================
+def list_watermark_sources(uploaded_files):
+    """展开上传的文件列表（图片或ZIP），返回 [(文件名, 读取函数)]
+
+    读取函数在真正处理时才调用，ZIP中的图片不会一次性全部解压到内存。
+    """
+    sources = []
+    for uploaded in uploaded_files:
+        name = getattr(uploaded, 'name', 'image')
+        if os.path.splitext(name)[1].lower() == '.zip':
+            archive = zipfile.ZipFile(uploaded)
+            for info in archive.infolist():
+                member = os.path.basename(info.filename)
+                # 跳过目录、macOS 资源文件和非图片文件
+                if info.is_dir() or member.startswith('.') or info.filename.startswith('__MACOSX/'):
+                    continue
+                if os.path.splitext(member)[1].lower() in WATERMARK_IMAGE_EXTENSIONS:
+                    sources.append((member, lambda archive=archive, info=info: archive.read(info)))
+        else:
+            sources.append((name, uploaded.getvalue))
+    return sources
+
+
+class WatermarkResult:
+    """一张图片的处理结果；失败时 data 为 None，error 为错误信息"""
+    def __init__(self, index, name, arcname, data=None, error=None):
+        self.index = index
+        self.name = name
+        self.arcname = arcname
+        self.data = data
+        self.error = error
+
+
+def run_watermark_task(index, name, data, logo_image, settings, output_format):
+    """处理一张图片：解码 → 加水印 → 编码
+
+    settings: (x_percent, y_percent, size_percent, opacity)
+    """
+    arcname = watermarked_name(name, index, output_format)
+    try:
+        with Image.open(BytesIO(data)) as img:
+            result = add_logo(img, logo_image, *settings, in_place=True)
+        return WatermarkResult(index, name, arcname, encode_watermarked(result, output_format))
+    except Exception as e:
+        return WatermarkResult(index, name, arcname, error=str(e))
+
+
+def iter_watermark_results(sources, logo_image, settings, output_format='JPG', max_workers=None):
+    """并行处理 list_watermark_sources() 返回的图片，按完成顺序逐个产出 WatermarkResult
+
+    源文件在提交任务时才读取，在途任务数有上限，已完成的结果取走后才继续提交。
+    """
+    # Logo 可能是延迟加载的图片，先在当前线程加载，避免多个线程同时解码
+    logo_image.load()
+    workers = min(max_workers or default_worker_count(), max(len(sources), 1))
+
+    if workers <= 1:
+        for index, (name, read) in enumerate(sources):
+            yield run_watermark_task(index, name, read(), logo_image, settings, output_format)
+        return
+
+    calls = ((run_watermark_task, index, name, read(), logo_image, settings, output_format)
+             for index, (name, read) in enumerate(sources))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from iter_bounded(executor, calls, workers * TASKS_IN_FLIGHT_PER_WORKER)
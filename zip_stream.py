@@ -0,0 +1,204 @@
+# zip_stream.py - 流式ZIP打包
+"""
+边生成边写入ZIP：每个文件只编码一次，直接追加到压缩包中。
+
+JPG/PNG/MP4 等本身已压缩的格式以 STORED 方式存储（再压缩只浪费CPU）；
+压缩包先写在内存里，超过阈值后转存到磁盘临时文件，内存占用保持有界。
+转存的文件在会话替换压缩包时删除，会话结束后遗留的超过 ARCHIVE_TTL_HOURS 后清理。
+
+下载时用 file_reader / archive_reader 生成读取函数传给 st.download_button，
+点击下载时才读取内容，而不是每次页面重新运行都把整个文件读入内存。
+"""
+import io
+import os
+import time
+import zipfile
+import tempfile
+
+# 本身已经压缩过的格式，不再DEFLATE
+STORED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.mp4', '.mov', '.mkv', '.zip'}
+# 转存到磁盘的压缩包目录（环境变量 ZIP_SPILL_DIR 可改到更大的磁盘）
+SPILL_ROOT = os.environ.get(
+    "ZIP_SPILL_DIR", os.path.join(tempfile.gettempdir(), "product-image-tool", "archives")
+)
+# 超过该小时数未修改的转存文件视为会话已结束遗留，会被清理
+ARCHIVE_TTL_HOURS = float(os.environ.get("ZIP_ARCHIVE_TTL_HOURS", 24))
+SPILL_PREFIX = "archive-"
+
+
+def _spill_threshold_from_env():
+    try:
+        return int(float(os.environ.get("ZIP_SPILL_MB", 256)) * 1024 * 1024)
+    except ValueError:
+        return 256 * 1024 * 1024
+
+
+def cleanup_stale_archives(root=None, ttl_hours=None):
+    """删除长时间未修改的转存压缩包（只处理本模块创建的文件）"""
+    root = root or SPILL_ROOT
+    ttl = (ARCHIVE_TTL_HOURS if ttl_hours is None else ttl_hours) * 3600
+    if not os.path.isdir(root):
+        return
+    now = time.time()
+    for name in os.listdir(root):
+        if not name.startswith(SPILL_PREFIX):
+            continue
+        path = os.path.join(root, name)
+        try:
+            if now - os.path.getmtime(path) > ttl:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+class SpillBuffer(io.RawIOBase):
+    """先写内存，超过阈值后转存到磁盘临时文件的可读写缓冲"""
+    def __init__(self, threshold, spill_dir=None):
+        super().__init__()
+        self.threshold = threshold
+        self.spill_dir = spill_dir or SPILL_ROOT
+        self.path = None
+        self._file = io.BytesIO()
+
+    @property
+    def spilled(self):
+        return self.path is not None
+
+    def _spill(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        cleanup_stale_archives(self.spill_dir)
+        fd, self.path = tempfile.mkstemp(prefix=SPILL_PREFIX, suffix='.zip', dir=self.spill_dir)
+        disk_file = open(fd, 'w+b')
+        disk_file.write(self._file.getbuffer())
+        disk_file.seek(self._file.tell())
+        self._file = disk_file
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        written = self._file.write(data)
+        if not self.spilled and self._file.tell() > self.threshold:
+            self._spill()
+        return written
+
+    def readinto(self, buffer):
+        data = self._file.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def detach_file(self):
+        """交出底层文件（BytesIO 或磁盘文件），指针回到开头"""
+        f, self._file = self._file, io.BytesIO()
+        f.flush()
+        f.seek(0)
+        return f
+
+
+class ZipStreamWriter:
+    """流式ZIP写入器
+
+    用法：
+        writer = ZipStreamWriter()
+        writer.add("a.jpg", data)
+        archive = writer.finish()   # BytesIO 或已打开的磁盘文件
+        st.download_button(data=archive_reader(archive), ...)
+    """
+    def __init__(self, spill_threshold=None, spill_dir=None):
+        if spill_threshold is None:
+            spill_threshold = _spill_threshold_from_env()
+        self._buffer = SpillBuffer(spill_threshold, spill_dir)
+        self._zip = zipfile.ZipFile(self._buffer, 'w', zipfile.ZIP_DEFLATED)
+        self._names = set()
+        self.count = 0
+
+    def _unique_name(self, arcname):
+        """重名文件自动追加序号，避免ZIP中出现重复条目"""
+        name, n = arcname, 1
+        stem, ext = os.path.splitext(arcname)
+        while name in self._names:
+            n += 1
+            name = f"{stem}_{n}{ext}"
+        self._names.add(name)
+        return name
+
+    def add(self, arcname, data):
+        """追加一个文件（字节），返回实际写入的文件名"""
+        name = self._unique_name(arcname)
+        ext = os.path.splitext(name)[1].lower()
+        compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+        self._zip.writestr(name, data, compress_type=compress_type)
+        self.count += 1
+        return name
+
+    def add_file(self, path, arcname=None):
+        """追加一个磁盘文件（分块复制，不整体读入内存）"""
+        name = self._unique_name(arcname or os.path.basename(path))
+        ext = os.path.splitext(name)[1].lower()
+        compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+        self._zip.write(path, name, compress_type=compress_type)
+        self.count += 1
+        return name
+
+    def finish(self):
+        """写入目录并返回压缩包文件对象：未超过阈值时为 BytesIO，否则为磁盘文件"""
+        self._zip.close()
+        spilled = self._buffer.spilled
+        archive = self._buffer.detach_file()
+        if spilled:
+            # 以只读方式重新打开，会话状态中只保留文件句柄和路径
+            archive.close()
+            archive = open(self._buffer.path, 'rb')
+        return archive
+
+
+def archive_size(archive):
+    """压缩包字节数（BytesIO 或磁盘文件）"""
+    if archive is None:
+        return 0
+    if isinstance(archive, io.BytesIO):
+        return archive.getbuffer().nbytes
+    try:
+        return os.fstat(archive.fileno()).st_size
+    except (OSError, ValueError):
+        return 0
+
+
+def release_archive(archive):
+    """释放旧压缩包；磁盘上的临时文件一并删除"""
+    if archive is None or isinstance(archive, io.BytesIO):
+        return
+    path = getattr(archive, 'name', None)
+    archive.close()
+    if isinstance(path, str) and os.path.exists(path):
+        os.remove(path)
+
+
+def file_reader(path):
+    """返回读取整个文件的函数（传给 st.download_button，点击下载时才执行）"""
+    def read():
+        with open(path, 'rb') as f:
+            return f.read()
+    return read
+
+
+def archive_reader(archive):
+    """返回读取压缩包内容的函数：内存中的直接取出，转存到磁盘的按路径读取"""
+    if isinstance(archive, io.BytesIO):
+        return archive.getvalue
+    return file_reader(archive.name)